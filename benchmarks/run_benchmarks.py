@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+"""
+Benchmarks of the acquisition, buffering, rendering and export hot paths.
+
+They run offline against the simulated IcePAP system and print the
+results as JSON. A previous result file can be given to report the
+benchmarks that got slower.
+
+    python benchmarks/run_benchmarks.py -o results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# The benchmarks must not use (nor create) the settings of the user.
+HOME = tempfile.mkdtemp(prefix='icepaposc_bench_')
+os.environ['HOME'] = HOME
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import numpy as np  # noqa: E402
+from PyQt5 import QtWidgets  # noqa: E402
+from icepaposc import version  # noqa: E402
+from icepaposc.collector import Collector  # noqa: E402
+from icepaposc.curve_item import CurveItem  # noqa: E402
+from icepaposc.settings import Settings  # noqa: E402
+from icepaposc.simulator import SimulatedController  # noqa: E402
+from icepaposc.window_main import WindowMain  # noqa: E402
+
+SIGNALS = ['PosAxis', 'EncEncin', 'StatReady', 'MeasI']
+SAMPLE_PERIOD = 0.01  # [seconds]
+
+# Sizes of the benchmarks: full and --quick.
+SIZES = {
+    'channels': ([1, 8, 32, 128], [1, 8]),
+    'history': ([10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6], [10 ** 3, 10 ** 5]),
+    'view_history': ([10 ** 4, 10 ** 5, 10 ** 6], [10 ** 4]),
+    'export_history': ([10 ** 4, 10 ** 5], [10 ** 4]),
+}
+
+
+class Result:
+    """Timings of a benchmark for a set of parameters."""
+
+    def __init__(self, name, params, times, items=1, unit='call'):
+        """
+        Initializes an instance of class Result.
+
+        name   - Benchmark name.
+        params - Dictionary with the parameters of the benchmark.
+        times  - List of the measured times [seconds].
+        items  - Number of items processed in each measured time.
+        unit   - What the items are.
+        """
+        self.name = name
+        self.params = params
+        self.times = times
+        self.items = items
+        self.unit = unit
+
+    def key(self):
+        """Identifies the benchmark and parameters in a result file."""
+        params = ','.join('{}={}'.format(k, v)
+                          for k, v in sorted(self.params.items()))
+        return '{}[{}]'.format(self.name, params)
+
+    def to_dict(self):
+        median = statistics.median(self.times)
+        return {'name': self.name,
+                'params': self.params,
+                'repeat': len(self.times),
+                'min': min(self.times),
+                'median': median,
+                'mean': statistics.mean(self.times),
+                'max': max(self.times),
+                'unit': self.unit,
+                'throughput': self.items / median if median > 0 else 0.}
+
+
+def timed(func, repeat):
+    """
+    Times a function.
+
+    func   - Function without arguments.
+    repeat - Number of calls.
+    Return: List of times [seconds].
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def make_samples(n, t_end=None, phase=0.):
+    """
+    Creates the samples of a sine signal.
+
+    n     - Number of samples.
+    t_end - Time of the last sample. None for now.
+    phase - Phase of the sine.
+    Return: Array of shape (n, 2) with the (time, value) rows.
+    """
+    if t_end is None:
+        t_end = time.time()
+    t = t_end - SAMPLE_PERIOD * np.arange(n - 1, -1, -1, dtype=np.float64)
+    return np.column_stack((t, 1000. * np.sin(t + phase)))
+
+
+def get_settings():
+    settings = Settings()
+    settings.use_thread = False
+    settings.sample_rate = 10
+    settings.dump_rate = 2
+    settings.use_auto_save = False
+    settings.max_age = 0
+    settings.max_samples = 0
+    settings.memory_budget = 0
+    settings.history_on_disk = False
+    return settings
+
+
+def bench_tick(args):
+    """Collector._tick() vs number of channels."""
+    results = []
+    for channels in SIZES['channels'][args.quick]:
+        num_axes = max(1, channels // len(SIGNALS))
+        controller = SimulatedController(num_axes=num_axes)
+        collector = Collector('simulator', 5000, 3, get_settings(),
+                              lambda sid, values: None,
+                              backend=lambda *a, **k: controller)
+        for i in range(channels):
+            addr = controller.axes[i % num_axes]
+            sid = collector.subscribe(addr, SIGNALS[i // num_axes])
+            collector.start(sid)
+        # The tick re-arms the timer, which never fires without event
+        # loop.
+        times = timed(collector._tick, args.repeat)
+        collector.close()
+        results.append(Result('collector.tick', {'channels': channels},
+                              times, channels, 'sample'))
+    return results
+
+
+def bench_curve_item(args):
+    """CurveItem collect, get_time_index and update_curve vs history."""
+    from pyqtgraph import ViewBox
+    results = []
+    rng = np.random.RandomState(0)
+    for history in SIZES['history'][args.quick]:
+        ci = CurveItem(1, 1, 'PosAxis', 1, 0)
+        t_end = time.time()
+        ci.collect(make_samples(history, t_end))
+        params = {'history': history}
+
+        # A dump of the collector.
+        dumps = [make_samples(2, t_end + SAMPLE_PERIOD * 2 * (i + 1))
+                 for i in range(args.repeat)]
+        it = iter(dumps)
+        times = timed(lambda: ci.collect(next(it)), args.repeat)
+        results.append(Result('curve_item.collect', params, times, 2,
+                              'sample'))
+        t_end = dumps[-1][-1, 0]
+
+        # Lookups of times never asked before (no cache hits).
+        t0 = ci.array_time[0]
+        t1 = ci.array_time[-1]
+        lookups = iter(rng.uniform(t0, t1, args.repeat))
+        times = timed(lambda: ci.get_time_index(next(lookups)),
+                      args.repeat)
+        results.append(Result('curve_item.get_time_index', params, times))
+
+        # Scrolling window of 1000 samples and full range, with one new
+        # dump before each update.
+        view_box = ViewBox()
+        ci.attach(view_box)
+        for name, span in [('scroll', 1000 * SAMPLE_PERIOD),
+                           ('full', None)]:
+            times = []
+            for _ in range(args.repeat):
+                t_end += 2 * SAMPLE_PERIOD
+                ci.collect(make_samples(2, t_end))
+                t_min = t_end - span if span else ci.array_time[0]
+                t = time.perf_counter()
+                ci.update_curve(t_min, t_end, 2000)
+                times.append(time.perf_counter() - t)
+            results.append(Result('curve_item.update_curve',
+                                  dict(params, range=name), times))
+        ci.detach()
+        ci.close()
+    return results
+
+
+def get_window(curves, history):
+    """
+    Creates a main window with simulated curves.
+
+    curves  - Number of curves.
+    history - Number of samples of each curve.
+    Return: WindowMain instance.
+    """
+    siglist = ['{}:{}:1'.format(i // len(SIGNALS) + 1,
+                                SIGNALS[i % len(SIGNALS)])
+               for i in range(curves)]
+    w = WindowMain('simulator', 5000, 3, siglist, 1,
+                   backend=SimulatedController)
+    w.resize(1200, 800)
+    w.show()
+    # The acquisition would add samples while measuring.
+    w.collector.close()
+    w._render_ticker.stop()
+    w._retention_ticker.stop()
+    QtWidgets.QApplication.processEvents()
+    t_end = time.time()
+    for i, ci in enumerate(w.curve_items):
+        ci.clear()
+        w.callback_collect(ci.subscription_id,
+                           make_samples(history, t_end, i))
+    return w
+
+
+def bench_update_view(args):
+    """WindowMain._update_view() frame time vs history."""
+    results = []
+    curves = 4
+    for history in SIZES['view_history'][args.quick]:
+        w = get_window(curves, history)
+        t_end = float(w.curve_items[0].array_time[-1])
+        for view in ['last 10 s', 'all']:
+            if view == 'all':
+                w._view_all_data()
+            else:
+                w.view_boxes[0].setXRange(t_end - 10, t_end, padding=0)
+            times = []
+            for _ in range(args.repeat):
+                t_end += 2 * SAMPLE_PERIOD
+                for i, ci in enumerate(w.curve_items):
+                    w.callback_collect(ci.subscription_id,
+                                       make_samples(2, t_end, i))
+                w.collector.get_current_time = lambda: t_end
+                t = time.perf_counter()
+                w._update_view()
+                times.append(time.perf_counter() - t)
+            results.append(Result('window_main.update_view',
+                                  {'curves': curves, 'history': history,
+                                   'view': view}, times, 1, 'frame'))
+        w.close()
+    return results
+
+
+def bench_export(args):
+    """WindowMain._create_csv_file() and _auto_save() throughput."""
+    results = []
+    curves = 4
+    folder = tempfile.mkdtemp(dir=HOME)
+    for history in SIZES['export_history'][args.quick]:
+        w = get_window(curves, history)
+        params = {'curves': curves, 'history': history}
+        repeat = max(1, args.repeat // 20)
+        times = timed(lambda: w._create_csv_file(io.StringIO()), repeat)
+        results.append(Result('window_main.create_csv_file', params, times,
+                              history, 'row'))
+
+        # Time until the writer thread has written the new samples.
+        w.settings.use_auto_save = True
+        w.settings.as_folder = folder
+        w._prepare_next_auto_save()
+        for ci in w.curve_items:
+            ci.save_mark = ci.buffer.first_index
+        t_end = float(w.curve_items[0].array_time[-1])
+        for fmt in w.settings.as_formats:
+            w.settings.as_format = fmt
+            w._auto_save(True)
+            w._writer.queue.join()
+            times = []
+            for _ in range(repeat):
+                t_end += history * SAMPLE_PERIOD
+                for i, ci in enumerate(w.curve_items):
+                    w.callback_collect(ci.subscription_id,
+                                       make_samples(history, t_end, i))
+                t = time.perf_counter()
+                w._auto_save()
+                w._writer.queue.join()
+                times.append(time.perf_counter() - t)
+            results.append(Result('window_main.auto_save',
+                                  dict(params, format=fmt), times, history,
+                                  'row'))
+        w.settings.use_auto_save = False
+        w.close()
+    shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+BENCHMARKS = [('tick', bench_tick),
+              ('curve_item', bench_curve_item),
+              ('update_view', bench_update_view),
+              ('export', bench_export)]
+
+
+def compare(results, baseline, threshold):
+    """
+    Finds the benchmarks slower than in a previous run.
+
+    results   - List of result dictionaries.
+    baseline  - Previous result file contents.
+    threshold - Relative increase of the median time reported.
+    Return: List of messages.
+    """
+    previous = {r['key']: r for r in baseline['results']}
+    msgs = []
+    for res in results:
+        old = previous.get(res['key'])
+        if old is None or old['median'] <= 0:
+            continue
+        ratio = res['median'] / old['median']
+        if ratio > 1 + threshold:
+            msgs.append('{}: {:.3g} s -> {:.3g} s ({:+.0%})'.format(
+                res['key'], old['median'], res['median'], ratio - 1))
+    return msgs
+
+
+def get_parser():
+    desc = 'IcepapOSC benchmarks, using the simulated IcePAP system.\n'
+    desc += 'Version: {}.'.format(version)
+    parse = argparse.ArgumentParser(description=desc)
+    parse.add_argument('-o', '--output',
+                       help='Result file. Default: standard output')
+    parse.add_argument('-b', '--bench', nargs='+',
+                       choices=[name for name, _ in BENCHMARKS],
+                       help='Benchmarks to run. Default: all')
+    parse.add_argument('-r', '--repeat', type=int, default=200,
+                       help='Measurements per benchmark')
+    parse.add_argument('-q', '--quick', action='store_true',
+                       help='Only the smaller sizes')
+    parse.add_argument('-c', '--compare', metavar='FILE',
+                       help='Previous result file. Exit with error if a '
+                            'benchmark got slower')
+    parse.add_argument('-t', '--threshold', type=float, default=0.2,
+                       help='Relative slowdown reported by --compare')
+    return parse
+
+
+def main():
+    args = get_parser().parse_args()
+    app = QtWidgets.QApplication([])
+    results = []
+    try:
+        for name, bench in BENCHMARKS:
+            if args.bench and name not in args.bench:
+                continue
+            print('Running {}...'.format(name), file=sys.stderr)
+            for res in bench(args):
+                d = res.to_dict()
+                d['key'] = res.key()
+                results.append(d)
+    finally:
+        app.quit()
+        shutil.rmtree(HOME, ignore_errors=True)
+
+    output = {'version': version,
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'platform': platform.platform(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'results': results}
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        msgs = compare(results, baseline, args.threshold)
+        for msg in msgs:
+            print('Slower: ' + msg, file=sys.stderr)
+        if msgs:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
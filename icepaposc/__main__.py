@@ -22,6 +22,8 @@ from PyQt5.QtWidgets import QApplication
 from .window_main import WindowMain
 import argparse
 from . import version
+from .simulator import add_simulator_arguments, get_simulator
+from .trigger import add_trigger_arguments, get_triggers
 
 
 def get_parser():
@@ -39,7 +41,13 @@ def get_parser():
 
     parse.add_argument('--version', action='version', version=ver)
 
-    parse.add_argument('host', help='IcePAP Host')
+    parse.add_argument('host', nargs='?',
+                       help='IcePAP Host. Several systems: '
+                            '<host>[:<port>],<host>[:<port>]...')
+    add_simulator_arguments(parse)
+    parse.add_argument('-o', '--open', metavar='FILE',
+                       help='Display a saved capture (.csv or .npz) '
+                            'instead of connecting to IcePAP')
     parse.add_argument('--axis', help='Selected axis', default=1, type=int)
     parse.add_argument('-p', '--port', type=int, default=5000,
                        help='IcePAP port')
@@ -48,6 +56,7 @@ def get_parser():
     parse.add_argument('-s', '--sig', nargs='*', default=[],
                        help='Preselected signals '
                             '<driver>:<signal name>:<Y-axis>')
+    add_trigger_arguments(parse)
 
     # TODO: Allow to pass the axes preselected and type of graph
     # parse.add_argument('-a', nargs='*', help='Axes to save, default all',
@@ -59,10 +68,23 @@ def get_parser():
 
 
 def main():
-    args = get_parser().parse_args()
+    parser = get_parser()
+    args = parser.parse_args()
+    if args.host is None:
+        if args.simulate:
+            args.host = 'simulator'
+        elif args.open is None:
+            parser.error('the host is required unless --open or '
+                         '--simulate is used')
+
+    try:
+        triggers = get_triggers(args)
+    except Exception as e:
+        parser.error(e)
 
     app = QApplication(sys.argv)
-    win = WindowMain(args.host, args.port, args.timeout, args.sig, args.axis)
+    win = WindowMain(args.host, args.port, args.timeout, args.sig, args.axis,
+                     args.open, get_simulator(args), triggers)
     win.show()
     sys.exit(app.exec_())
 
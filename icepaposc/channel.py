@@ -32,6 +32,9 @@ class Channel:
         self.sig_name = signal_name
         self.measure_resolution = 1.
         self.collected_samples = []
+        # Derivation computing the values of a derived signal. None for
+        # a signal read from the controller.
+        self.derivation = None
 
     def equals(self, icepap_addr, signal_name):
         """
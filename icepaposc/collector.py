@@ -17,30 +17,59 @@
 # along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
 # -----------------------------------------------------------------------------
 
-from PyQt5 import QtCore
 from collections import OrderedDict
 from icepap import IcePAPController
 from .channel import Channel
+from .derived import DERIVED_SIGNALS, Derivation
+from .reader import ConcurrentReader
+from .sampler import Sampler
+from .scheduler import Scheduler, TickStatistics
+from threading import Event, Lock, Thread
 import time
 
+# Value of the samples of the drivers missed.
+NAN = float('nan')
+
 
 class Collector:
     """Feeds a subscriber with collected IcePAP signal data."""
 
-    def __init__(self, host, port, timeout, settings, callback):
+    # The drivers of the n-th IcePAP system (from 0) are addressed as
+    # n * ADDR_OFFSET + <driver address>.
+    ADDR_OFFSET = 1000
+
+    def __init__(self, host, port, timeout, settings, callback,
+                 event_loop=True, backend=None):
         """
         Initializes an instance of class Collector.
 
-        host     - The IcePAP system host name.
-        port     - The IcePAP system port number.
-        timeout  - Socket timeout.
-        callback - A callback function used for sending collected signal
-                   data back to the caller.
-                   cb_func(subscription_id, value_list)
-                       subscription_id - The subscription id retained when
-                                         subscribing for a signal.
-                       value_list      - A list of tuples
-                                         (time_stamp, signal_value)
+        host       - The IcePAP system host name. Several systems can be
+                     given separated by commas, optionally with their
+                     port: "<host>[:<port>],<host>[:<port>]...". They
+                     are read concurrently and their samples share the
+                     same time stamps (see ADDR_OFFSET). The drivers not
+                     read within the read timeout setting are sampled as
+                     nan, and backed off if they keep failing (see
+                     ConcurrentReader).
+        port       - The IcePAP system port number (default of the
+                     hosts without port).
+        timeout    - Socket timeout.
+        callback   - A callback function used for sending collected signal
+                     data back to the caller.
+                     cb_func(subscription_id, value_list)
+                         subscription_id - The subscription id retained
+                                           when subscribing for a signal.
+                         value_list      - A list of tuples
+                                           (time_stamp, signal_value),
+                                           or an array of such rows
+        event_loop - If True, the acquisition is driven by Qt timers. If
+                     False, Qt is not used: the signals are acquired in
+                     the sampler thread and the caller must call poll()
+                     regularly to receive them.
+        backend    - Class (or factory) connecting to the IcePAP system,
+                     called as backend(host, port, timeout,
+                     auto_axes=True). None for IcePAPController. See
+                     SimulatedController.
         """
         self.sig_getters = OrderedDict(
             [('PosAxis', self._getter_pos_axis),
@@ -52,55 +81,148 @@ class Collector:
              ('PosMotor', self._getter_pos_motor),
              ('PosCtrlenc', self._getter_pos_ctrlenc),
              ('PosMeasure', self._getter_pos_measure),
-             ('DifAxMeasure', self._getter_dif_ax_measure),
-             ('DifAxMotor', self._getter_dif_ax_motor),
-             ('DifAxTgtenc', self._getter_dif_ax_tgtenc),
-             ('DifAxShftenc', self._getter_dif_ax_shftenc),
-             ('DifAxCtrlenc', self._getter_dif_ax_ctrlenc),
+             ('DifAxMeasure', None),
+             ('DifAxMotor', None),
+             ('DifAxTgtenc', None),
+             ('DifAxShftenc', None),
+             ('DifAxCtrlenc', None),
              ('EncEncin', self._getter_enc_encin),
              ('EncAbsenc', self._getter_enc_absenc),
              ('EncTgtenc', self._getter_enc_tgtenc),
              ('EncInpos', self._getter_enc_inpos),
-             ('StatReady', self._getter_stat_ready),
-             ('StatMoving', self._getter_stat_moving),
-             ('StatSettling', self._getter_stat_settling),
-             ('StatOutofwin', self._getter_stat_outofwin),
-             ('StatStopcode', self._getter_stat_stopcode),
-             ('StatWarning', self._getter_stat_warning),
-             ('StatLim+', self._getter_stat_limit_positive),
-             ('StatLim-', self._getter_stat_limit_negative),
-             ('StatHome', self._getter_stat_home),
+             ('StatReady', None),
+             ('StatMoving', None),
+             ('StatSettling', None),
+             ('StatOutofwin', None),
+             ('StatStopcode', None),
+             ('StatWarning', None),
+             ('StatLim+', None),
+             ('StatLim-', None),
+             ('StatHome', None),
              ('MeasI', self._getter_meas_i),
              ('MeasIa', self._getter_meas_ia),
              ('MeasIb', self._getter_meas_ib),
              ('MeasVm', self._getter_meas_vm)]
         )
+        # The derived signals have no getter. They are computed from
+        # their register values in blocks (see derived.py).
+        for sig_name in DERIVED_SIGNALS:
+            self.sig_getters.setdefault(sig_name, None)
+        # The raw status word, to decode any of its fields later.
+        self.sig_getters['StatWord'] = self._getter_stat_word
+        # The controller registers each signal is derived from. All the
+        # active channels sharing a register are read with a single
+        # multi-axis query per tick.
+        self.sig_registers = {
+            'PosAxis': [('POS', 'AXIS')],
+            'PosTgtenc': [('POS', 'TGTENC')],
+            'PosShftenc': [('POS', 'SHFTENC')],
+            'PosEncin': [('POS', 'ENCIN')],
+            'PosAbsenc': [('POS', 'ABSENC')],
+            'PosInpos': [('POS', 'INPOS')],
+            'PosMotor': [('POS', 'MOTOR')],
+            'PosCtrlenc': [('POS', 'CTRLENC')],
+            'PosMeasure': [('FPOS', 'MEASURE')],
+            'EncEncin': [('ENC', 'ENCIN')],
+            'EncAbsenc': [('ENC', 'ABSENC')],
+            'EncTgtenc': [('ENC', 'TGTENC')],
+            'EncInpos': [('ENC', 'INPOS')],
+            'MeasI': [('MEAS', 'I')],
+            'MeasIa': [('MEAS', 'IA')],
+            'MeasIb': [('MEAS', 'IB')],
+            'MeasVm': [('MEAS', 'VM')],
+            'StatWord': [('STATUS', '')]
+        }
+        for sig_name, derived in DERIVED_SIGNALS.items():
+            self.sig_registers[sig_name] = derived.registers
         self.host = host
         self.port = port
+        self.timeout = timeout
         self.settings = settings
         self.cb = callback
-        self.icepap_system = None
+        self.icepap_systems = []
+        # (host, port) of each system, and the connections used to read
+        # a driver on its own: {driver address: controller}.
+        self.hosts = parse_hosts(host, port)
+        self.driver_systems = {}
+        self.reader = None
         self.channels_subscribed = {}
         self.channels = {}
         self.channel_id = 0
-        self.current_channel = 0
+        self.read_groups = {}
+        self.active = ({}, ())
+        self.snapshot = {}
+        self.snapshot_reads = 0
+        self.trigger_engine = None
         self.sig_list = list(self.sig_getters.keys())
-
-        try:
-            self.icepap_system = IcePAPController(self.host, self.port,
-                                                  timeout, auto_axes=True)
-        except Exception as e:
-            msg = 'Failed to instantiate master controller.\nHost: ' \
-                  '{}\nPort: {}\n{}'.format(self.host, self.port, e)
-            raise Exception(msg)
-        if not self.icepap_system:
-            msg = 'IcePAP system {} has no active drivers! ' \
-                  'Aborting.'.format(self.host)
-            raise Exception(msg)
-
-        self.ticker = QtCore.QTimer()
-        self.ticker.timeout.connect(self._tick)
-        self.ticker.start(self.settings.sample_rate)
+        # Configuration of the drivers, retrieved once: {address: cfg}.
+        self.driver_cfgs = {}
+        self._cfg_lock = Lock()
+        self._cfg_stop = Event()
+
+        if backend is None:
+            backend = IcePAPController
+        self.backend = backend
+        for sys_host, sys_port in self.hosts:
+            try:
+                system = backend(sys_host, sys_port, timeout,
+                                 auto_axes=True)
+            except Exception as e:
+                msg = 'Failed to instantiate master controller.\nHost: ' \
+                      '{}\nPort: {}\n{}'.format(sys_host, sys_port, e)
+                raise Exception(msg)
+            if not system:
+                msg = 'IcePAP system {} has no active drivers! ' \
+                      'Aborting.'.format(sys_host)
+                raise Exception(msg)
+            self.icepap_systems.append(system)
+        # A read per system, plus one per driver read on its own
+        # connection.
+        num_drivers = sum(len(system.axes) for system in self.icepap_systems)
+        self.reader = ConcurrentReader(
+            self._read_system, self.ADDR_OFFSET,
+            len(self.icepap_systems) + min(num_drivers, 32),
+            release_func=self._close_driver_system)
+
+        self.statistics = TickStatistics()
+        self.scheduler = Scheduler(self._get_sample_rate, self.statistics,
+                                   self.settings.catch_up)
+        self.sampler = None
+        self.ticker = None
+        if self.settings.use_thread or not event_loop:
+            self.sampler = Sampler(self._acquire, self.scheduler)
+            self.sampler.start()
+        if event_loop:
+            # Imported here so that Qt is not needed without event loop.
+            from PyQt5 import QtCore
+            self.ticker = QtCore.QTimer()
+            if self.sampler:
+                self.ticker.timeout.connect(self._drain)
+                self.ticker.start(self.settings.sample_rate)
+            else:
+                self.ticker.setTimerType(QtCore.Qt.PreciseTimer)
+                self.ticker.timeout.connect(self._tick)
+                self.ticker.start(0)
+
+    def close(self):
+        """Stops the data collection."""
+        self._cfg_stop.set()
+        if self.ticker:
+            self.ticker.stop()
+        if self.sampler:
+            self.sampler.stop(self.timeout)
+        if self.reader:
+            self.reader.close()
+        for addr in list(self.driver_systems):
+            self._close_driver_system(addr // self.ADDR_OFFSET, addr)
+
+    def poll(self):
+        """
+        Sends the signal data acquired by the sampler thread so far to
+        the subscriber. Only needed without event loop.
+        """
+        for samples in self.sampler.take():
+            self._dispatch(samples)
 
     def get_available_drivers(self):
         """
@@ -108,15 +230,70 @@ class Collector:
 
         Return: List of available drivers.
         """
-        return self.icepap_system.axes
+        return [n * self.ADDR_OFFSET + addr
+                for n, system in enumerate(self.icepap_systems)
+                for addr in system.axes]
 
-    def get_available_signals(self):
+    def get_available_signals(self, icepap_addr=None):
         """
         Retrieves the available signals.
 
+        icepap_addr - IcePAP driver address. If given, and the
+                      configuration of the driver has already been
+                      retrieved, the signals not mapped in the driver are
+                      left out. The driver is never queried (see
+                      warm_up_driver_cfgs()).
         Return: List of available signals.
         """
-        return self.sig_list
+        cfg = self.driver_cfgs.get(icepap_addr)
+        if cfg is None:
+            return self.sig_list
+        return [sig for sig in self.sig_list if self._is_mapped(sig, cfg)]
+
+    def get_driver_cfg(self, icepap_addr):
+        """
+        Retrieves the configuration of a driver. It is queried only the
+        first time (see invalidate_driver_cfg()).
+
+        icepap_addr - IcePAP driver address.
+        Return: Dictionary of configuration parameters. Exception if
+                the query failed.
+        """
+        cfg = self.driver_cfgs.get(icepap_addr)
+        if cfg is None:
+            with self._cfg_lock:
+                cfg = self.driver_cfgs.get(icepap_addr)
+                if cfg is None:
+                    system, addr = self._get_system(icepap_addr)
+                    cfg = system[addr].get_cfg()
+                    self.driver_cfgs[icepap_addr] = cfg
+        return cfg
+
+    def invalidate_driver_cfg(self, icepap_addr=None):
+        """
+        Forgets the configuration retrieved from a driver, after it has
+        been changed. It is queried again when needed.
+
+        icepap_addr - IcePAP driver address. None for all the drivers.
+        """
+        with self._cfg_lock:
+            if icepap_addr is None:
+                self.driver_cfgs.clear()
+            else:
+                self.driver_cfgs.pop(icepap_addr, None)
+
+    def warm_up_driver_cfgs(self, callback=None):
+        """
+        Retrieves the configuration of all the drivers in a background
+        thread, so that it is at hand when subscribing to their signals.
+        The configuration queries are slow: they are sent on connections
+        of their own, not to delay the acquisition.
+
+        callback - Function called, from the background thread, when done.
+        """
+        thread = Thread(target=self._warm_up_driver_cfgs, args=(callback,))
+        thread.daemon = True
+        thread.start()
 
     def get_signal_index(self, signal_name):
         """
@@ -126,6 +303,36 @@ class Collector:
         """
         return self.sig_list.index(signal_name)
 
+    def get_channel(self, subscription_id):
+        """
+        Retrieves the channel of a subscription.
+
+        subscription_id - The given subscription id.
+        Return: Channel instance. None if not subscribed.
+        """
+        return self.channels_subscribed.get(subscription_id)
+
+    def get_statistics(self):
+        """
+        Retrieves the timing statistics of the acquisition.
+
+        Return: Dictionary as described in TickStatistics.get(), plus
+                dropped    - Number of acquisitions lost because the GUI
+                             did not consume them in time.
+                backed_off - List of the drivers not read because they
+                             failed or did not answer in time.
+        """
+        stats = self.statistics.get()
+        stats['dropped'] = self.sampler.dropped if self.sampler else 0
+        stats['backed_off'] = self.reader.get_backed_off()
+        return stats
+
+    def reset_statistics(self):
+        """Clears the timing statistics of the acquisition."""
+        self.statistics.reset()
+        if self.sampler:
+            self.sampler.dropped = 0
+
     @staticmethod
     def get_current_time():
         """
@@ -150,21 +357,22 @@ class Collector:
                 raise Exception(msg)
         channel = Channel(icepap_addr, signal_name)
         sn = str(signal_name)
-        cond_1 = sn.endswith('Tgtenc')
-        cond_2 = sn.endswith('Shftenc')
-        cond_3 = sn == 'DifAxMeasure'
-        if cond_1 or cond_2 or cond_3:
+        derived = DERIVED_SIGNALS.get(sn)
+        if derived:
+            channel.derivation = Derivation(derived)
+        cond_1 = sn.endswith('Tgtenc') or sn.endswith('Shftenc')
+        cond_2 = derived is not None and derived.scaled
+        if cond_1 or cond_2:
             try:
-                cfg = self.icepap_system[icepap_addr].get_cfg()
-            except RuntimeError as e:
+                cfg = self.get_driver_cfg(icepap_addr)
+            except Exception as e:
                 msg = 'Failed to retrieve configuration parameters ' \
                       'for driver {}\n{}.'.format(icepap_addr, e)
                 raise Exception(msg)
-            if (cond_1 and cfg['TGTENC'].upper() == 'NONE') or \
-                    (cond_2 and cfg['SHFTENC'].upper() == 'NONE'):
+            if not self._is_mapped(sn, cfg):
                 msg = 'Signal {} is not mapped/valid.'.format(sn)
                 raise Exception(msg)
-            if cond_3:
+            if cond_2:
                 channel.set_measure_resolution(cfg)
         self.channel_id += 1
         self.channels_subscribed[self.channel_id] = channel
@@ -180,6 +388,7 @@ class Collector:
                 subscription_id not in list(self.channels.keys()):
             self.channels[subscription_id] = \
                 self.channels_subscribed[subscription_id]
+            self._update_read_groups()
 
     def unsubscribe(self, subscription_id):
         """
@@ -190,117 +399,328 @@ class Collector:
         if subscription_id in list(self.channels_subscribed.keys()):
             del self.channels[subscription_id]
             del self.channels_subscribed[subscription_id]
+            self._update_read_groups()
+            if self.trigger_engine:
+                self.trigger_engine.discard(subscription_id)
 
-    def _tick(self):
-        for subscription_id, channel in self.channels.items():
-            self.current_channel = subscription_id
+    def set_trigger_engine(self, engine):
+        """
+        Evaluates triggers on the collected samples.
+
+        engine - TriggerEngine fed with every collected sample. None for
+                 no triggers.
+        """
+        self.trigger_engine = engine
+
+    def _update_read_groups(self):
+        """
+        Groups the drivers of the active channels by controller register.
+        """
+        groups = {}
+        for channel in self.channels.values():
+            for reg in self.sig_registers[channel.sig_name]:
+                addrs = groups.setdefault(reg, [])
+                if channel.icepap_address not in addrs:
+                    addrs.append(channel.icepap_address)
+        for addrs in groups.values():
+            addrs.sort()
+        self.read_groups = groups
+        # Replaced as a whole so the sampler thread always sees a
+        # consistent set of channels and registers.
+        self.active = (groups, tuple(self.channels.items()))
+
+    @staticmethod
+    def _is_mapped(sig_name, cfg):
+        """
+        Checks that the encoder of a signal is mapped in a driver.
+
+        sig_name - Signal name.
+        cfg      - Configuration of the driver.
+        Return: True if the signal can be acquired from the driver.
+        """
+        if sig_name.endswith('Tgtenc'):
+            return cfg['TGTENC'].upper() != 'NONE'
+        if sig_name.endswith('Shftenc'):
+            return cfg['SHFTENC'].upper() != 'NONE'
+        return True
+
+    def _warm_up_driver_cfgs(self, callback):
+        for n, (sys_host, sys_port) in enumerate(self.hosts):
             try:
-                addr = channel.icepap_address
-                val = self.sig_getters[channel.sig_name](addr)
+                system = self.backend(sys_host, sys_port, self.timeout,
+                                      auto_axes=False)
+            except Exception:
+                # Retried, and reported, when needed.
+                continue
+            try:
+                for addr in self.icepap_systems[n].axes:
+                    icepap_addr = n * self.ADDR_OFFSET + addr
+                    if self._cfg_stop.is_set():
+                        return
+                    if icepap_addr in self.driver_cfgs:
+                        continue
+                    try:
+                        cfg = system[addr].get_cfg()
+                    except Exception:
+                        continue
+                    with self._cfg_lock:
+                        self.driver_cfgs.setdefault(icepap_addr, cfg)
+            finally:
+                system.disconnect()
+        if callback:
+            callback()
+
+    def _get_system(self, addr):
+        """
+        Finds the IcePAP system of a driver.
+
+        addr - Driver address (see ADDR_OFFSET).
+        Return: Tuple (system, driver address in the system).
+        """
+        n, local_addr = divmod(addr, self.ADDR_OFFSET)
+        if n >= len(self.icepap_systems):
+            raise RuntimeError('There is no driver {}.'.format(addr))
+        return self.icepap_systems[n], local_addr
+
+    def _read_snapshot(self, read_groups):
+        """
+        Reads all the registers needed by the active channels, issuing
+        one controller query per register and IcePAP system. The systems,
+        and the drivers read on their own, are read concurrently.
+
+        read_groups - Dictionary {(query, register): [driver address]}.
+        Return: Dictionary {(query, register): {driver address: value}}.
+                The drivers missed are not included.
+        """
+        timeout = self.settings.read_timeout / 1000.
+        snapshot, missed = self.reader.read(read_groups, timeout)
+        if missed:
+            self.statistics.add_missed(missed)
+        return snapshot
+
+    def _read_system(self, n, read_groups, own_addr=None):
+        """
+        Reads the registers of the drivers of an IcePAP system.
+
+        n           - Index of the system.
+        read_groups - Dictionary {(query, register): [driver address]}.
+        own_addr    - Driver address to read on a connection of its own
+                      (see ConcurrentReader). None to use the connection
+                      of the system.
+        Return: Tuple (dictionary {(query, register): {driver address:
+                value}}, set of addresses of the drivers whose read
+                failed).
+        """
+        if own_addr is None:
+            system = self.icepap_systems[n]
+        else:
+            system = self._get_driver_system(n, own_addr)
+        offset = n * self.ADDR_OFFSET
+        snapshot = {}
+        failed = set()
+        for (query, register), addrs in read_groups.items():
+            local_addrs = [addr - offset for addr in addrs]
+            t0 = time.monotonic()
+            try:
+                if query == 'POS':
+                    values = system.get_pos(local_addrs, register)
+                elif query == 'FPOS':
+                    values = system.get_fpos(local_addrs, register)
+                elif query == 'ENC':
+                    values = system.get_enc(local_addrs, register)
+                elif query == 'STATUS':
+                    values = system.get_fstatus(local_addrs)
+                else:
+                    # There is no multi-axis measure command.
+                    values = [system[addr].meas(register)
+                              for addr in local_addrs]
             except RuntimeError as e:
-                msg = 'Failed to collect data for signal ' \
-                      '{}\n{}'.format(channel.sig_name, e)
+                msg = 'Failed to read register {} {} for drivers ' \
+                      '{}\n{}'.format(query, register, addrs, e)
                 print(msg)
+                failed.update(addrs)
+                continue
+            finally:
+                elapsed = (time.monotonic() - t0) / len(addrs)
+                for addr in addrs:
+                    self.statistics.add_driver_time(addr, elapsed)
+            snapshot[(query, register)] = dict(zip(addrs, values))
+        return snapshot, failed
+
+    def _get_driver_system(self, n, addr):
+        """
+        Retrieves the connection used to read a driver on its own,
+        connecting the first time.
+
+        n    - Index of the system.
+        addr - Driver address.
+        Return: Controller of the system.
+        """
+        system = self.driver_systems.get(addr)
+        if system is None:
+            sys_host, sys_port = self.hosts[n]
+            system = self.backend(sys_host, sys_port, self.timeout,
+                                  auto_axes=False)
+            self.driver_systems[addr] = system
+        return system
+
+    def _close_driver_system(self, n, addr):
+        """
+        Closes the connection used to read a driver on its own, if any.
+
+        n    - Index of the system.
+        addr - Driver address.
+        """
+        system = self.driver_systems.pop(addr, None)
+        if system is not None:
+            system.disconnect()
+
+    def _read(self, addr, query, register=''):
+        """
+        Retrieves a register value of the current tick.
+
+        All the signals of a tick use the same values (read at the same
+        instant by _read_snapshot()), never querying the controller.
+
+        addr     - Driver address.
+        query    - Query ('POS', 'FPOS', 'ENC', 'STATUS' or 'MEAS').
+        register - Register name.
+        Return: Register value. nan if the driver was missed.
+        """
+        value = self.snapshot.get((query, register), {}).get(addr)
+        if value is None:
+            return NAN
+        self.snapshot_reads += 1
+        return value
+
+    def _get_sample_rate(self):
+        return self.settings.sample_rate
+
+    def _acquire(self):
+        """
+        Reads one sample of every active channel.
+
+        Return: List of tuples (subscription_id, (time_stamp, signal_value)).
+        """
+        read_groups, channels = self.active
+        self.snapshot = self._read_snapshot(read_groups)
+        self.snapshot_reads = 0
+        now = time.time()
+        samples = []
+        for subscription_id, channel in channels:
+            # The samples of the drivers missed are nan, keeping the
+            # time base of all the channels aligned.
+            addr = channel.icepap_address
+            if channel.derivation:
+                val = tuple(self._read(addr, *reg) for reg in
+                            self.sig_registers[channel.sig_name])
+            else:
+                val = self.sig_getters[channel.sig_name](addr)
+            samples.append((subscription_id, (now, val)))
+        misses = sum(len(values) for values in self.snapshot.values())
+        self.statistics.add_reads(max(self.snapshot_reads - misses, 0),
+                                  misses)
+        return samples
+
+    def _dispatch(self, samples):
+        for subscription_id, tv in samples:
+            channel = self.channels.get(subscription_id)
+            if channel is None:  # Unsubscribed after the acquisition.
                 continue
-            tv = (time.time(), val)
             channel.collected_samples.append(tv)
-            if len(channel.collected_samples) >= self.settings.dump_rate:
-                self.cb(subscription_id, channel.collected_samples)
-                channel.collected_samples = []
+            if len(channel.collected_samples) < self.settings.dump_rate:
+                continue
+            values = channel.collected_samples
+            channel.collected_samples = []
+            if channel.derivation:
+                # All the samples of the dump at once.
+                values = channel.derivation.evaluate(
+                    values, channel.measure_resolution)
+                if not len(values):
+                    continue
+            if self.trigger_engine:
+                for t, v in values:
+                    self.trigger_engine.feed(subscription_id, channel, t, v)
+            self.cb(subscription_id, values)
+
+    def _tick(self):
+        self.scheduler.tick_started()
+        self._dispatch(self._acquire())
+        self.ticker.start(int(round(1000 * self.scheduler.next_delay())))
+
+    def _drain(self):
+        self.poll()
         self.ticker.start(self.settings.sample_rate)
 
     def _getter_pos_axis(self, addr):
-        return self.icepap_system[addr].pos
+        return self._read(addr, 'POS', 'AXIS')
 
     def _getter_pos_tgtenc(self, addr):
-        return self.icepap_system[addr].pos_tgtenc
+        return self._read(addr, 'POS', 'TGTENC')
 
     def _getter_pos_shftenc(self, addr):
-        return self.icepap_system[addr].pos_shftenc
+        return self._read(addr, 'POS', 'SHFTENC')
 
     def _getter_pos_encin(self, addr):
-        return self.icepap_system[addr].pos_encin
+        return self._read(addr, 'POS', 'ENCIN')
 
     def _getter_pos_absenc(self, addr):
-        return self.icepap_system[addr].pos_absenc
+        return self._read(addr, 'POS', 'ABSENC')
 
     def _getter_pos_inpos(self, addr):
-        return self.icepap_system[addr].pos_inpos
+        return self._read(addr, 'POS', 'INPOS')
 
     def _getter_pos_motor(self, addr):
-        return self.icepap_system[addr].pos_motor
+        return self._read(addr, 'POS', 'MOTOR')
 
     def _getter_pos_ctrlenc(self, addr):
-        return self.icepap_system[addr].pos_ctrlenc
+        return self._read(addr, 'POS', 'CTRLENC')
 
     def _getter_pos_measure(self, addr):
-        return self.icepap_system.get_fpos(self.icepap_system[addr].addr,
-                                           'MEASURE')[0]
-
-    def _getter_dif_ax_measure(self, addr):
-        pos_measure = self._getter_pos_measure(addr) / \
-                      self.channels[self.current_channel].measure_resolution
-        return self._getter_pos_axis(addr) - pos_measure
-
-    def _getter_dif_ax_motor(self, addr):
-        return self._getter_pos_axis(addr) - self._getter_pos_motor(addr)
-
-    def _getter_dif_ax_tgtenc(self, addr):
-        return self._getter_pos_axis(addr) - self._getter_pos_tgtenc(addr)
-
-    def _getter_dif_ax_shftenc(self, addr):
-        return self._getter_pos_axis(addr) - self._getter_pos_shftenc(addr)
-
-    def _getter_dif_ax_ctrlenc(self, addr):
-        return self._getter_pos_axis(addr) - self._getter_pos_ctrlenc(addr)
+        return self._read(addr, 'FPOS', 'MEASURE')
 
     def _getter_enc_encin(self, addr):
-        return self.icepap_system[addr].enc_encin
+        return self._read(addr, 'ENC', 'ENCIN')
 
     def _getter_enc_absenc(self, addr):
-        return self.icepap_system[addr].enc_absenc
+        return self._read(addr, 'ENC', 'ABSENC')
 
     def _getter_enc_tgtenc(self, addr):
-        return self.icepap_system[addr].enc_tgtenc
+        return self._read(addr, 'ENC', 'TGTENC')
 
     def _getter_enc_inpos(self, addr):
-        return self.icepap_system[addr].enc_inpos
-
-    def _getter_stat_ready(self, addr):
-        return 1 if self.icepap_system[addr].state_ready else 0
+        return self._read(addr, 'ENC', 'INPOS')
 
-    def _getter_stat_moving(self, addr):
-        return 1 if self.icepap_system[addr].state_moving else 0
-
-    def _getter_stat_settling(self, addr):
-        return 1 if self.icepap_system[addr].state_settling else 0
-
-    def _getter_stat_outofwin(self, addr):
-        return 1 if self.icepap_system[addr].state_outofwin else 0
-
-    def _getter_stat_stopcode(self, addr):
-        return self.icepap_system[addr].state_stop_code
-
-    def _getter_stat_warning(self, addr):
-        return 1 if self.icepap_system[addr].state_warning else 0
-
-    def _getter_stat_limit_positive(self, addr):
-        return 1 if self.icepap_system[addr].state_limit_positive else 0
-
-    def _getter_stat_limit_negative(self, addr):
-        return 1 if self.icepap_system[addr].state_limit_negative else 0
-
-    def _getter_stat_home(self, addr):
-        return 1 if self.icepap_system[addr].state_inhome else 0
+    def _getter_stat_word(self, addr):
+        return self._read(addr, 'STATUS')
 
     def _getter_meas_i(self, addr):
-        return self.icepap_system[addr].meas_i
+        return self._read(addr, 'MEAS', 'I')
 
     def _getter_meas_ia(self, addr):
-        return self.icepap_system[addr].meas_ia
+        return self._read(addr, 'MEAS', 'IA')
 
     def _getter_meas_ib(self, addr):
-        return self.icepap_system[addr].meas_ib
+        return self._read(addr, 'MEAS', 'IB')
 
     def _getter_meas_vm(self, addr):
-        return self.icepap_system[addr].meas_vm
+        return self._read(addr, 'MEAS', 'VM')
+
+
+def parse_hosts(host, port):
+    """
+    Splits the description of several IcePAP systems.
+
+    host - "<host>[:<port>],<host>[:<port>]..."
+    port - Port of the hosts without port.
+    Return: List of tuples (host, port).
+    """
+    hosts = []
+    for item in host.split(','):
+        name, _, sys_port = item.strip().partition(':')
+        try:
+            hosts.append((name, int(sys_port) if sys_port else port))
+        except ValueError:
+            msg = 'Bad port in IcePAP host "{}".'.format(item)
+            raise Exception(msg)
+    return hosts
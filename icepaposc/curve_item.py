@@ -21,6 +21,9 @@ from PyQt5 import QtCore, QtGui
 from collections import namedtuple
 from threading import RLock
 from pyqtgraph import PlotCurveItem
+import numpy as np
+from .sample_buffer import SampleBuffer
+from .decimation import MinMaxPyramid
 
 
 class CurveItem:
@@ -91,24 +94,41 @@ class CurveItem:
         SignalAppearance(QtGui.QColor(204, 153, 102), 1,
                          QtCore.Qt.DashLine),
         SignalAppearance(QtGui.QColor(255, 204, 0), 1,
-                         QtCore.Qt.DashLine)
+                         QtCore.Qt.DashLine),
+        SignalAppearance(QtGui.QColor(0, 255, 255), 2,
+                         QtCore.Qt.DashDotLine),
+        SignalAppearance(QtGui.QColor(255, 0, 255), 2,
+                         QtCore.Qt.DashDotLine),
+        SignalAppearance(QtGui.QColor(153, 255, 153), 1,
+                         QtCore.Qt.DashDotLine),
+        SignalAppearance(QtGui.QColor(255, 170, 0), 1,
+                         QtCore.Qt.DashDotLine),
+        SignalAppearance(QtGui.QColor(204, 204, 204), 1,
+                         QtCore.Qt.DotLine)
     ]
 
+    # Number of points (or min/max blocks) per plot item.
+    CHUNK_LEN = 256
+
     def __init__(self, subscription_id, driver_addr, sig_name, y_axis,
-                 color_idx):
+                 color_idx, new_buffer=SampleBuffer):
         """
         Initializes an instance of class CurveItem.
 
         driver_addr - IcePAP driver address.
         sig_name    - Signal name.
         y_axis      - Y axis to plot against.
+        new_buffer  - Function creating a SampleBuffer from its initial
+                      capacity. Selects where the samples are stored.
         """
         self.subscription_id = subscription_id
         self.driver_addr = driver_addr
         self.signal_name = sig_name
         self.y_axis = y_axis
-        self.array_time = []
-        self.array_val = []
+        self.buffer = new_buffer(1024)
+        self.pyramid = MinMaxPyramid(new_buffer=new_buffer)
+        # What the curve displays: (first index, end index, level).
+        self._drawn = None
         self.val_min = 0
         self.val_max = 0
         col_item = self.colors[color_idx]
@@ -116,32 +136,122 @@ class CurveItem:
         self.pen = {'color': col_item.pen_color,
                     'width': col_item.pen_width,
                     'style': col_item.pen_style}
-        self.curve = None
+        self.view_box = None
+        # Plot items displaying the samples: {(level, number): (item,
+        # sample range)}.
+        self._chunks = {}
+        # Absolute index of the first sample not auto saved yet.
+        self.save_mark = 0
         self.lock = RLock()
         self.signature = ''
         self.update_signature()
 
+    @property
+    def array_time(self):
+        """Array with the time of the collected samples."""
+        return self.buffer.times
+
+    @property
+    def array_val(self):
+        """Array with the value of the collected samples."""
+        return self.buffer.values
+
     def update_signature(self):
         """Sets the new value of the signature string."""
         self.signature = '{}:{}:{}'.format(self.driver_addr,
                                            self.signal_name,
                                            self.y_axis)
 
-    def create_curve(self):
-        """Creates a new plot item."""
+    def attach(self, view_box):
+        """
+        Displays the curve.
+
+        view_box - The view box to plot in.
+        """
+        with self.lock:
+            self.view_box = view_box
+            self._drawn = None
+
+    def detach(self):
+        """Removes the curve from its view box."""
         with self.lock:
-            self.curve = PlotCurveItem(x=self.array_time,
-                                       y=self.array_val,
-                                       pen=self.pen)
-        return self.curve
+            for item, _ in self._chunks.values():
+                self.view_box.removeItem(item)
+            self._chunks = {}
+            self.view_box = None
+
+    def update_curve(self, time_min, time_max, max_points=None):
+        """
+        Updates the curve with recent collected data.
 
-    def update_curve(self, time_min, time_max):
-        """Updates the curve with recent collected data."""
+        time_min   - Start of the time range to display.
+        time_max   - End of the time range to display.
+        max_points - Max number of points to draw. If there are more
+                     samples in the range, the curve is drawn from their
+                     min/max summary. None draws all the samples.
+        Return: False if the curve already displayed that data.
+        """
         with self.lock:
-            idx_min = self.get_time_index(time_min)
-            idx_max = self.get_time_index(time_max)
-            self.curve.setData(x=self.array_time[idx_min:idx_max],
-                               y=self.array_val[idx_min:idx_max])
+            if self.view_box is None:
+                return False
+            idx_min = max(self.get_time_index(time_min), 0)
+            idx_max = max(self.get_time_index(time_max), 0)
+            level = 0
+            if max_points:
+                level = self.pyramid.choose_level(idx_max - idx_min,
+                                                  max_points)
+            first = self.buffer.first_index
+            drawn = (first + idx_min, first + idx_max, level)
+            if drawn == self._drawn:
+                return False
+            self._draw_chunks(first + idx_min, first + idx_max, level)
+            self._drawn = drawn
+            return True
+
+    def _draw_chunks(self, i0, i1, level):
+        """
+        Draws a range of samples as a sequence of chunks.
+
+        A chunk is a plot item with CHUNK_LEN points (or min/max blocks) of
+        a given level. Chunks that are complete never change, so when the
+        plot scrolls only the newest chunk is rebuilt and the chunks
+        leaving the range are removed. Changing the level (zooming)
+        rebuilds all of them.
+
+        i0    - Absolute index of the first sample.
+        i1    - Absolute index after the last sample.
+        level - Level of detail.
+        """
+        block = self.pyramid.block_size(level)
+        span = self.CHUNK_LEN * block
+        origin = self.pyramid.origin
+        first = self.buffer.first_index
+        end = self.buffer.end_index
+        wanted = {}
+        if i1 > i0:
+            for c in range((i0 - origin) // span,
+                           (i1 - 1 - origin) // span + 1):
+                # Overlap with the next chunk to keep the line continuous.
+                start = max(origin + c * span, first)
+                stop = min(origin + (c + 1) * span + block, end)
+                wanted[(level, c)] = (start, stop)
+        for chunk_id in list(self._chunks):
+            if chunk_id not in wanted:
+                item, _ = self._chunks.pop(chunk_id)
+                self.view_box.removeItem(item)
+        for chunk_id, sample_range in wanted.items():
+            item, drawn = self._chunks.get(chunk_id, (None, None))
+            if drawn == sample_range:
+                continue
+            x, y = self.pyramid.get_data(self.buffer,
+                                         sample_range[0] - first,
+                                         sample_range[1] - first, level)
+            if item is None:
+                # The samples missed (nan) are drawn as gaps.
+                item = PlotCurveItem(pen=self.pen, connect='finite')
+                self.view_box.addItem(item)
+            item.setData(x=x, y=y)
+            self._chunks[chunk_id] = (item, sample_range)
 
     def in_range(self, t):
         """
@@ -152,7 +262,7 @@ class CurveItem:
                 Otherwise False.
         """
         with self.lock:
-            if self.array_time and \
+            if len(self.buffer) and \
                     self.array_time[0] < t < self.array_time[-1]:
                 return True
         return False
@@ -164,22 +274,101 @@ class CurveItem:
         Return: Time of the first collected data sample. -1 if none.
         """
         with self.lock:
-            if self.array_time:
-                return self.array_time[0]
+            if len(self.buffer):
+                return float(self.array_time[0])
         return -1
 
     def collect(self, new_data):
         """Store new collected data."""
+        data = np.asarray(new_data, dtype=np.float64)
+        with self.lock:
+            if not len(self.buffer):
+                self.val_min = self.val_max = np.nan
+            self.buffer.append(data[:, 0], data[:, 1])
+            self.pyramid.update(self.buffer)
+            # The samples missed are nan. Ignore them.
+            self.val_max = np.fmax(self.val_max, np.fmax.reduce(data[:, 1]))
+            self.val_min = np.fmin(self.val_min, np.fmin.reduce(data[:, 1]))
+
+    def drop_before(self, time_val):
+        """
+        Drops the samples older than a given time.
+
+        time_val - Time value.
+        Return: Number of samples dropped.
+        """
         with self.lock:
-            if not self.array_val:
-                self.val_min = self.val_max = new_data[0][1]
-            for t, v in new_data:
-                self.array_time.append(t)
-                self.array_val.append(v)
-                if v > self.val_max:
-                    self.val_max = v
-                elif v < self.val_min:
-                    self.val_min = v
+            n = int(np.searchsorted(self.array_time, time_val))
+            if n:
+                self.buffer.drop(n)
+                self.pyramid.update(self.buffer)
+                self._update_min_max()
+            return n
+
+    def apply_retention(self, max_age=0, max_samples=0, time_limit=None):
+        """
+        Drops the samples not covered by the retention policy.
+
+        max_age     - Max age of a sample relative to the newest one
+                      [seconds]. 0 means no limit.
+        max_samples - Max number of samples. 0 means no limit.
+        time_limit  - If not None, samples collected at or after this time
+                      are kept regardless of the policy.
+        Return: Number of samples dropped.
+        """
+        with self.lock:
+            if not len(self.buffer):
+                return 0
+            drop_time = self.array_time[0]
+            if max_samples and len(self.buffer) > max_samples:
+                drop_time = self.array_time[-max_samples]
+            if max_age:
+                drop_time = max(drop_time, self.array_time[-1] - max_age)
+            if time_limit is not None:
+                drop_time = min(drop_time, time_limit)
+            return self.drop_before(drop_time)
+
+    def samples_since(self, time_val):
+        """
+        Counts the samples collected at or after a given time.
+
+        time_val - Time value.
+        Return: Number of samples.
+        """
+        with self.lock:
+            return len(self.buffer) - \
+                int(np.searchsorted(self.array_time, time_val))
+
+    def compact(self):
+        """Releases the memory of the samples dropped."""
+        with self.lock:
+            self.buffer.compact()
+            self.pyramid.compact()
+
+    def memory_usage(self):
+        """
+        Retrieves the memory allocated for the collected samples and
+        their min/max summary.
+
+        Return: Memory usage [bytes].
+        """
+        return self.buffer.nbytes + self.pyramid.nbytes
+
+    def _update_min_max(self):
+        # The min/max summary gives the exact extremes without reading
+        # (or paging in) all the samples.
+        n = len(self.buffer)
+        if n:
+            level = self.pyramid.choose_level(n, 1024)
+            _, y = self.pyramid.get_data(self.buffer, 0, n, level)
+            self.val_min = np.fmin.reduce(y)
+            self.val_max = np.fmax.reduce(y)
+
+    def close(self):
+        """Releases the storage of the samples."""
+        with self.lock:
+            self.buffer.close()
+            self.pyramid.close()
 
     def get_y(self, time_val):
         """
@@ -193,32 +382,22 @@ class CurveItem:
             return self.array_val[idx]
 
     def clear(self):
-        self.array_time[:] = []
-        self.array_val[:] = []
+        with self.lock:
+            self.buffer.clear()
+            self.pyramid.reset(self.buffer.first_index)
 
     def get_time_index(self, time_val):
         """
         Retrieve the sample index corresponding to the provided time value.
 
         t_val - Time value.
-        Return: Index of a sample adjacent to the provided time value.
+        Return: Index of the first sample not older than the provided time
+                value (binary search, O(log n)). -1 if there are no
+                samples.
         """
         with self.lock:
-            if not self.array_time:
+            if not len(self.buffer):
                 return -1
-            if len(self.array_time) == 1:
-                return 0
-            time_min = self.array_time[0]
-            time_max = self.array_time[-1]
-            if time_val < time_min:
+            if len(self.buffer) == 1:
                 return 0
-            elif time_val > time_max:
-                return len(self.array_time)
-            delta_t = time_max - time_min
-            t = time_val - time_min
-            idx = int((t / delta_t) * len(self.array_time))
-            while self.array_time[idx] > time_val:
-                idx -= 1
-            while self.array_time[idx] < time_val:
-                idx += 1
-            return idx
+            return int(np.searchsorted(self.array_time, time_val))
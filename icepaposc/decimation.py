@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+import numpy as np
+from .sample_buffer import SampleBuffer
+
+
+class _Level:
+    """One level of a MinMaxPyramid."""
+
+    def __init__(self, new_buffer):
+        # Minimum and maximum of each block, with the time they occurred.
+        self.mins = new_buffer(256)
+        self.maxs = new_buffer(256)
+        # Number of items of the level below consumed so far.
+        self.done = 0
+
+    def __len__(self):
+        return len(self.mins)
+
+    @property
+    def first_block(self):
+        return self.mins.first_index
+
+    @property
+    def end_block(self):
+        return self.mins.end_index
+
+
+class MinMaxPyramid:
+    """
+    Multi-resolution min/max summary of the samples in a SampleBuffer.
+
+    Level 1 holds the minimum and maximum of each block of `factor` raw
+    samples, level 2 those of each block of `factor` level 1 blocks, and
+    so on. Only complete blocks are stored, so the levels are updated
+    incrementally as samples are appended. Drawing the minimum and
+    maximum of every block preserves the spikes of the signal.
+    """
+
+    def __init__(self, factor=4, max_levels=12, new_buffer=SampleBuffer):
+        """
+        Initializes an instance of class MinMaxPyramid.
+
+        factor     - Number of items of a level summarized by one block of
+                     the level above.
+        max_levels - Number of levels.
+        new_buffer - Function creating the SampleBuffer of a level from
+                     its initial capacity.
+        """
+        self.factor = factor
+        self.max_levels = max_levels
+        self.new_buffer = new_buffer
+        self.levels = []
+        self.reset()
+
+    def reset(self, origin=0):
+        """
+        Removes all the levels.
+
+        origin - Absolute index of the next raw sample. Blocks are aligned
+                 to it.
+        """
+        self.close()
+        self.origin = origin
+        self.levels = [_Level(self.new_buffer)
+                       for _ in range(self.max_levels)]
+
+    def close(self):
+        """Releases the storage of the levels."""
+        for level in self.levels:
+            level.mins.close()
+            level.maxs.close()
+        self.levels = []
+
+    @property
+    def nbytes(self):
+        """Memory allocated by the levels [bytes]."""
+        return sum(level.mins.nbytes + level.maxs.nbytes
+                   for level in self.levels)
+
+    def compact(self):
+        """Releases the memory of the blocks dropped."""
+        for level in self.levels:
+            level.mins.compact()
+            level.maxs.compact()
+
+    def block_size(self, level):
+        """
+        Number of raw samples summarized by a block.
+
+        level - Level number (1 to max_levels).
+        """
+        return self.factor ** level
+
+    def update(self, buffer):
+        """
+        Summarizes the samples appended to, and forgets the samples dropped
+        from, a buffer since the last call.
+
+        buffer - The SampleBuffer being summarized.
+        """
+        first = buffer.first_index - self.origin
+        if first < 0:  # The buffer does not match. Start over.
+            self.reset(buffer.first_index)
+            first = 0
+        times = buffer.times
+        values = buffer.values
+        src = (times, values, times, values, first)
+        for level in self.levels:
+            src = self._update_level(level, src)
+            if src is None:
+                break
+
+    def _update_level(self, level, src):
+        min_t, min_v, max_t, max_v, first = src
+        f = self.factor
+        # Forget the blocks summarizing items not available anymore.
+        first_block = -(-first // f)
+        if level.done < first:
+            # Items dropped before being summarized. Realign.
+            level.mins.clear()
+            level.maxs.clear()
+            level.mins.first_index = level.maxs.first_index = first_block
+            level.done = first_block * f
+        elif first_block > level.first_block:
+            n = first_block - level.first_block
+            level.mins.drop(n)
+            level.maxs.drop(n)
+        # Summarize the new complete blocks.
+        start = level.done - first
+        n = (len(min_t) - start) // f
+        if n > 0:
+            rows = np.arange(n)
+            end = start + n * f
+            blk_v = min_v[start:end].reshape(n, f)
+            idx = _skip_nan(blk_v, np.inf).argmin(axis=1)
+            level.mins.append(min_t[start:end].reshape(n, f)[rows, idx],
+                              blk_v[rows, idx])
+            blk_v = max_v[start:end].reshape(n, f)
+            idx = _skip_nan(blk_v, -np.inf).argmax(axis=1)
+            level.maxs.append(max_t[start:end].reshape(n, f)[rows, idx],
+                              blk_v[rows, idx])
+            level.done += n * f
+        if not len(level):
+            return None
+        return (level.mins.times, level.mins.values,
+                level.maxs.times, level.maxs.values, level.first_block)
+
+    def choose_level(self, num_samples, max_points):
+        """
+        Selects the coarsest detail needed to draw a number of samples.
+
+        num_samples - Number of raw samples to draw.
+        max_points  - Max number of points to draw.
+        Return: Level number. 0 means raw samples.
+        """
+        level = 0
+        points = num_samples
+        while level < self.max_levels and points > max_points:
+            level += 1
+            points = 2 * num_samples // self.block_size(level)
+        return level
+
+    def get_data(self, buffer, idx_min, idx_max, level):
+        """
+        Retrieves the points to draw for a range of raw samples.
+
+        buffer  - The SampleBuffer summarized.
+        idx_min - Index in buffer of the first sample.
+        idx_max - Index in buffer after the last sample.
+        level   - Level of detail (see choose_level()).
+        Return: Tuple of arrays (x, y).
+        """
+        first = buffer.first_index - self.origin
+        xs, ys = self._get_data(buffer, first + idx_min, first + idx_max,
+                                level)
+        if not xs:
+            return np.empty(0), np.empty(0)
+        if len(xs) == 1:
+            return xs[0], ys[0]
+        return np.concatenate(xs), np.concatenate(ys)
+
+    def _get_data(self, buffer, i0, i1, level):
+        # i0 and i1 are raw indices relative to origin.
+        xs = []
+        ys = []
+        if i1 <= i0:
+            return xs, ys
+        if level == 0:
+            first = buffer.first_index - self.origin
+            xs.append(buffer.times[i0 - first:i1 - first])
+            ys.append(buffer.values[i0 - first:i1 - first])
+            return xs, ys
+        lvl = self.levels[level - 1]
+        size = self.block_size(level)
+        b0 = max(i0 // size, lvl.first_block)
+        b1 = min(-(-i1 // size), lvl.end_block)
+        if b1 <= b0:
+            return self._get_data(buffer, i0, i1, level - 1)
+        # Samples before and after the blocks available at this level.
+        head = self._get_data(buffer, i0, b0 * size, level - 1)
+        tail = self._get_data(buffer, b1 * size, i1, level - 1)
+        off = lvl.first_block
+        min_t = lvl.mins.times[b0 - off:b1 - off]
+        min_v = lvl.mins.values[b0 - off:b1 - off]
+        max_t = lvl.maxs.times[b0 - off:b1 - off]
+        max_v = lvl.maxs.values[b0 - off:b1 - off]
+        # Two points per block, in chronological order.
+        min_first = min_t <= max_t
+        x = np.empty(2 * len(min_t))
+        y = np.empty(2 * len(min_t))
+        x[0::2] = np.where(min_first, min_t, max_t)
+        y[0::2] = np.where(min_first, min_v, max_v)
+        x[1::2] = np.where(min_first, max_t, min_t)
+        y[1::2] = np.where(min_first, max_v, min_v)
+        return head[0] + [x] + tail[0], head[1] + [y] + tail[1]
+
+
+def _skip_nan(values, fill):
+    # The samples missed (nan) are not the extremes of their block,
+    # unless all the block was missed.
+    missed = np.isnan(values)
+    if missed.any():
+        return np.where(missed, fill, values)
+    return values
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+from collections import OrderedDict
+import numpy as np
+
+# Number of samples averaged by the moving average signals.
+AVERAGE_LEN = 10
+
+# Fields of the status word decoded by the Stat* signals: (shift, mask).
+STATUS_FIELDS = OrderedDict(
+    [('StatReady', (9, 1)),
+     ('StatMoving', (10, 1)),
+     ('StatSettling', (11, 1)),
+     ('StatOutofwin', (12, 1)),
+     ('StatStopcode', (14, 15)),
+     ('StatWarning', (13, 1)),
+     ('StatLim+', (18, 1)),
+     ('StatLim-', (19, 1)),
+     ('StatHome', (20, 1))]
+)
+
+
+class DerivedSignal:
+    """A signal computed from controller registers."""
+
+    def __init__(self, registers, function, history=0, scaled=False):
+        """
+        Initializes an instance of class DerivedSignal.
+
+        registers - List of the (query, register) operands. They are read
+                    with the registers of the other signals, in a single
+                    query per tick.
+        function  - Vectorized function computing the signal.
+                    function(times, operands, resolution)
+                        times      - Array of n sample times.
+                        operands   - Array (n, number of registers).
+                        resolution - Measure resolution of the driver.
+                    Return: Array with the values of the last m samples,
+                            m <= n.
+        history   - Number of previous samples the function needs to
+                    compute the value of a sample.
+        scaled    - True if the function uses the measure resolution.
+        """
+        self.registers = registers
+        self.function = function
+        self.history = history
+        self.scaled = scaled
+
+
+class Derivation:
+    """Computes a derived signal of a channel, block by block."""
+
+    def __init__(self, signal):
+        """
+        Initializes an instance of class Derivation.
+
+        signal - The DerivedSignal.
+        """
+        self.signal = signal
+        num_registers = len(signal.registers)
+        self._times = np.empty(0)
+        self._operands = np.empty((0, num_registers))
+
+    def evaluate(self, samples, resolution=1.):
+        """
+        Computes the signal for a block of samples.
+
+        samples    - List of tuples (time, operands).
+        resolution - Measure resolution of the driver.
+        Return: Array (m, 2) of (time, value) rows. Shorter than samples
+                until the first samples fill the history.
+        """
+        times = np.fromiter((t for t, _ in samples), np.float64,
+                            len(samples))
+        operands = np.array([op for _, op in samples], dtype=np.float64)
+        times = np.concatenate((self._times, times))
+        operands = np.concatenate((self._operands, operands))
+        values = self.signal.function(times, operands, resolution)
+        values = values[-len(samples):]
+        history = self.signal.history
+        if history:
+            self._times = times[-history:]
+            self._operands = operands[-history:]
+        return np.column_stack((times[len(times) - len(values):], values))
+
+
+def _difference(times, operands, resolution):
+    return operands[:, 0] - operands[:, 1]
+
+
+def _measure_difference(times, operands, resolution):
+    return operands[:, 0] - operands[:, 1] / resolution
+
+
+def _velocity(times, operands, resolution):
+    return np.diff(operands[:, 0]) / np.diff(times)
+
+
+def _acceleration(times, operands, resolution):
+    velocity = np.diff(operands[:, 0]) / np.diff(times)
+    return np.diff(velocity) / np.diff(times[1:])
+
+
+def _measure_velocity(times, operands, resolution):
+    return np.diff(operands[:, 0] / resolution) / np.diff(times)
+
+
+def _average_measure_difference(times, operands, resolution):
+    difference = _measure_difference(times, operands, resolution)
+    if len(difference) < AVERAGE_LEN:
+        return difference[:0]
+    window = np.full(AVERAGE_LEN, 1. / AVERAGE_LEN)
+    return np.convolve(difference, window, 'valid')
+
+
+def decode_status(words, sig_name):
+    """
+    Decodes a field of status words.
+
+    words    - Array of raw status words. nan if missed.
+    sig_name - Name of a Stat* signal (see STATUS_FIELDS).
+    Return: Array with the values of the field. nan where the word is.
+    """
+    shift, mask = STATUS_FIELDS[sig_name]
+    words = np.asarray(words, dtype=np.float64)
+    missed = np.isnan(words)
+    if not missed.any():
+        return (words.astype(np.int64) >> shift) & mask
+    fields = (np.where(missed, 0, words).astype(np.int64) >> shift) & mask
+    return np.where(missed, np.nan, fields)
+
+
+def _status_decoder(sig_name):
+    def decode(times, operands, resolution):
+        return decode_status(operands[:, 0], sig_name)
+    return decode
+
+
+_AXIS = ('POS', 'AXIS')
+_MEASURE = ('FPOS', 'MEASURE')
+
+# The derived signals by name.
+DERIVED_SIGNALS = OrderedDict(
+    [('DifAxMeasure', DerivedSignal([_AXIS, _MEASURE], _measure_difference,
+                                    scaled=True)),
+     ('DifAxMotor', DerivedSignal([_AXIS, ('POS', 'MOTOR')], _difference)),
+     ('DifAxTgtenc', DerivedSignal([_AXIS, ('POS', 'TGTENC')],
+                                   _difference)),
+     ('DifAxShftenc', DerivedSignal([_AXIS, ('POS', 'SHFTENC')],
+                                    _difference)),
+     ('DifAxCtrlenc', DerivedSignal([_AXIS, ('POS', 'CTRLENC')],
+                                    _difference)),
+     ('VelAxis', DerivedSignal([_AXIS], _velocity, 1)),
+     ('AccAxis', DerivedSignal([_AXIS], _acceleration, 2)),
+     ('VelMeasure', DerivedSignal([_MEASURE], _measure_velocity, 1,
+                                  scaled=True)),
+     ('DifAxMeasureAvg', DerivedSignal([_AXIS, _MEASURE],
+                                       _average_measure_difference,
+                                       AVERAGE_LEN - 1, scaled=True))]
+)
+# All the status fields of a dump are decoded at once, from the status
+# word read once per driver and tick.
+for _name in STATUS_FIELDS:
+    DERIVED_SIGNALS[_name] = DerivedSignal([('STATUS', '')],
+                                           _status_decoder(_name))
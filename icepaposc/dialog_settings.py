@@ -47,11 +47,19 @@ class DialogSettings(QtWidgets.QDialog):
         self.ui.sbLenAxisX.setMinimum(self.settings.default_x_axis_len_min)
         self.ui.sbLenAxisX.setMaximum(self.settings.default_x_axis_len_max)
         self.ui.sbLenAxisX.setValue(self.settings.default_x_axis_len)
+        self.ui.sbMaxFps.setMinimum(self.settings.max_fps_min)
+        self.ui.sbMaxFps.setMaximum(self.settings.max_fps_max)
+        self.ui.sbMaxFps.setValue(self.settings.max_fps)
         self.ui.cbUseAutoSave.setChecked(self.settings.use_auto_save)
         self.ui.cbAppend.setChecked(self.settings.use_append)
         self.ui.sbAutoSaveInterval.setMinimum(self.settings.as_interval_min)
         self.ui.sbAutoSaveInterval.setMaximum(self.settings.as_interval_max)
         self.ui.sbAutoSaveInterval.setValue(self.settings.as_interval)
+        self.ui.sbFlushInterval.setMinimum(self.settings.flush_interval_min)
+        self.ui.sbFlushInterval.setMaximum(self.settings.flush_interval_max)
+        self.ui.sbFlushInterval.setValue(self.settings.flush_interval)
+        self.ui.cbFormat.addItems(self.settings.as_formats)
+        self.ui.cbFormat.setCurrentText(self.settings.as_format)
         self.ui.leDataFolder.setText(self.settings.as_folder)
         self._as_state_changed()
         self.apply_button.setDisabled(True)
@@ -60,9 +68,12 @@ class DialogSettings(QtWidgets.QDialog):
         self.ui.sbSampleRate.valueChanged.connect(self._sample_rate_changed)
         self.ui.sbDumpRate.valueChanged.connect(self._dump_rate_changed)
         self.ui.sbLenAxisX.valueChanged.connect(self._x_axis_length_changed)
+        self.ui.sbMaxFps.valueChanged.connect(self._set_apply_state)
         self.ui.cbUseAutoSave.stateChanged.connect(self._as_state_changed)
         self.ui.cbAppend.stateChanged.connect(self._append_changed)
         self.ui.sbAutoSaveInterval.valueChanged.connect(self._as_intvl_changed)
+        self.ui.sbFlushInterval.valueChanged.connect(self._as_intvl_changed)
+        self.ui.cbFormat.currentIndexChanged.connect(self._set_apply_state)
         self.ui.btnOpenFolderDlg.clicked.connect(self._launch_folder_dialog)
         self.ui.leDataFolder.textChanged.connect(self._set_apply_state)
         self.apply_button.clicked.connect(self._apply)
@@ -83,11 +94,15 @@ class DialogSettings(QtWidgets.QDialog):
         eq = self.ui.sbSampleRate.value() == self.settings.sample_rate and \
            self.ui.sbDumpRate.value() == self.settings.dump_rate and \
            self.ui.sbLenAxisX.value() == self.settings.default_x_axis_len and \
+           self.ui.sbMaxFps.value() == self.settings.max_fps and \
            self.ui.cbUseAutoSave.isChecked() == \
            self.settings.use_auto_save and \
            self.ui.cbAppend.isChecked() == self.settings.use_append and \
            self.ui.sbAutoSaveInterval.value() == \
            self.settings.as_interval and \
+           self.ui.sbFlushInterval.value() == \
+           self.settings.flush_interval and \
+           self.ui.cbFormat.currentText() == self.settings.as_format and \
            self.ui.leDataFolder.text() == self.settings.as_folder
         self.apply_button.setDisabled(eq)
 
@@ -99,6 +114,8 @@ class DialogSettings(QtWidgets.QDialog):
         use = self.ui.cbUseAutoSave.isChecked()
         self.ui.cbAppend.setEnabled(use)
         self.ui.sbAutoSaveInterval.setEnabled(use)
+        self.ui.sbFlushInterval.setEnabled(use)
+        self.ui.cbFormat.setEnabled(use)
         self.ui.leDataFolder.setEnabled(use)
         self.ui.btnOpenFolderDlg.setEnabled(use)
         self._set_apply_state()
@@ -122,9 +139,12 @@ class DialogSettings(QtWidgets.QDialog):
         self.settings.sample_rate = self.ui.sbSampleRate.value()
         self.settings.dump_rate = self.ui.sbDumpRate.value()
         self.settings.default_x_axis_len = self.ui.sbLenAxisX.value()
+        self.settings.max_fps = self.ui.sbMaxFps.value()
         self.settings.use_auto_save = self.ui.cbUseAutoSave.isChecked()
         self.settings.use_append = self.ui.cbAppend.isChecked()
         self.settings.as_interval = self.ui.sbAutoSaveInterval.value()
+        self.settings.flush_interval = self.ui.sbFlushInterval.value()
+        self.settings.as_format = self.ui.cbFormat.currentText()
         self.settings.as_folder = auto_save_folder
         self.settings.update()
         self.parent.settings_updated()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+from collections import OrderedDict
+import io
+import itertools
+import json
+import struct
+import time
+import zipfile
+import zlib
+import numpy as np
+
+# Name of the NPZ member holding the capture description.
+NPZ_METADATA = "metadata.json"
+
+# Zip local file header: signature, version, flags, compression, time,
+# date, CRC-32, compressed size, size, name length, extra field length.
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_LOCAL_SIGNATURE = b"PK\x03\x04"
+
+
+def get_columns(curve_items, start_indices=None):
+    """
+    Retrieves the columns to export for a set of curves.
+
+    curve_items   - List of CurveItem.
+    start_indices - If not None, list with the absolute index (see
+                    SampleBuffer.first_index) of the first sample to export
+                    for each curve.
+    Return: List of tuples (header, array).
+    """
+    columns = []
+    for i, ci in enumerate(curve_items):
+        start_idx = 0
+        if start_indices is not None:
+            start_idx = max(start_indices[i] - ci.buffer.first_index, 0)
+        header = "{}-{}".format(ci.driver_addr, ci.signal_name)
+        columns.append(("time-" + header, ci.array_time[start_idx:]))
+        columns.append(("val-" + header, ci.array_val[start_idx:]))
+    return columns
+
+
+def get_metadata(collector, curve_items, settings):
+    """
+    Describes the capture of a set of curves.
+
+    collector   - The Collector acquiring the curves.
+    curve_items - List of CurveItem.
+    settings    - An instance of class Settings.
+    Return: Dictionary with the acquisition settings and, in "curves", a
+            list with a dictionary per curve.
+    """
+    curves = []
+    for ci in curve_items:
+        channel = collector.get_channel(ci.subscription_id)
+        resolution = channel.measure_resolution if channel else 1.
+        header = "{}-{}".format(ci.driver_addr, ci.signal_name)
+        curves.append({"driver": ci.driver_addr,
+                       "signal": ci.signal_name,
+                       "y_axis": ci.y_axis,
+                       "measure_resolution": resolution,
+                       "time": "time-" + header,
+                       "value": "val-" + header})
+    return {"host": collector.host,
+            "port": collector.port,
+            "sample_rate": settings.sample_rate,
+            "dump_rate": settings.dump_rate,
+            "curves": curves}
+
+
+def get_capture_path(folder, file_format, suffix=""):
+    """
+    Names a new capture file after the current time.
+
+    folder      - Folder of the file.
+    file_format - "csv" or "npz".
+    suffix      - Text added after the time.
+    Return: File path.
+    """
+    time_str = time.strftime("%Y%m%d_%H%M%S", time.localtime())
+    return "{}/IcepapOSC_{}{}.{}".format(folder, time_str, suffix,
+                                         file_format)
+
+
+def write_csv(csv_file, columns, first_row=0, header=True, precision=None,
+              chunk_len=8192):
+    """
+    Writes columns of samples to a CSV file.
+
+    The columns are aligned on their last element. The shorter ones are
+    padded with nan at the beginning. Rows are formatted and written in
+    chunks, without building a padded copy of the columns.
+
+    csv_file  - File object open for writing text.
+    columns   - List of tuples (header, array).
+    first_row - Number of the first row (first field of each line).
+    header    - If True, the line with the column names is written first.
+    precision - Number of significant digits of the values. None writes
+                them with full precision.
+    chunk_len - Number of rows formatted and written at once.
+    Return: Number of rows written.
+    """
+    if header:
+        csv_file.write("".join(",{}".format(h) for h, _ in columns) + "\n")
+    num_rows = max([len(col) for _, col in columns] + [0])
+    if not num_rows:
+        return 0
+    cell = "%r" if precision is None else "%.{}g".format(precision)
+    row_format = "%d" + ("," + cell) * len(columns) + "\n"
+    chunk = np.empty((min(chunk_len, num_rows), len(columns) + 1))
+    for r0 in range(0, num_rows, chunk_len):
+        r1 = min(r0 + chunk_len, num_rows)
+        rows = chunk[:r1 - r0]
+        rows[:, 0] = np.arange(first_row + r0, first_row + r1)
+        for j, (_, col) in enumerate(columns, 1):
+            pad = num_rows - len(col)
+            lo = min(max(r0, pad), r1)
+            rows[:lo - r0, j] = np.nan
+            rows[lo - r0:, j] = col[lo - pad:r1 - pad]
+        # Python floats (not numpy scalars) are needed for "%r".
+        csv_file.write("".join([row_format % tuple(row)
+                                for row in rows.tolist()]))
+    return num_rows
+
+
+def write_npz(npz_file, columns, first_row=0, metadata=None,
+              compress=False):
+    """
+    Appends columns of samples to a NPZ (zip of .npy arrays) file.
+
+    Every call adds one member "<column header>/<first row>.npy" per
+    column, so a file can be written in chunks. The members of a column
+    concatenated in name order give the whole column (see read_npz()).
+
+    npz_file  - File object open for reading and writing binary data. The
+                file is readable after every call, but appending re-reads
+                and rewrites the whole zip directory. To write many chunks,
+                pass a zipfile.ZipFile kept open instead: the directory is
+                written once, when it is closed.
+    columns   - List of tuples (header, array).
+    first_row - Number of the first row. Identifies the chunk.
+    metadata  - If not None, dictionary stored as JSON in member
+                NPZ_METADATA. Must be given once per file.
+    compress  - If True, the members are deflated.
+    Return: Number of rows written.
+    """
+    if isinstance(npz_file, zipfile.ZipFile):
+        return _write_npz_members(npz_file, columns, first_row, metadata,
+                                  compress)
+    npz_file.seek(0, io.SEEK_END)
+    mode = "a" if npz_file.tell() else "w"
+    with zipfile.ZipFile(npz_file, mode) as zf:
+        rows = _write_npz_members(zf, columns, first_row, metadata, compress)
+    npz_file.flush()
+    return rows
+
+
+def _write_npz_members(zf, columns, first_row, metadata, compress):
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    date_time = time.localtime()[:6]
+    if metadata is not None:
+        info = zipfile.ZipInfo(NPZ_METADATA, date_time)
+        info.compress_type = compression
+        zf.writestr(info, json.dumps(metadata, indent=1))
+    for header, col in columns:
+        info = zipfile.ZipInfo("{}/{:010d}.npy".format(header, first_row),
+                               date_time)
+        info.compress_type = compression
+        with zf.open(info, "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.ascontiguousarray(col),
+                                      allow_pickle=False)
+    return max([len(col) for _, col in columns] + [0])
+
+
+def read_npz(path):
+    """
+    Reads a file written with write_npz().
+
+    path - File path.
+    Return: Tuple (metadata, columns). metadata is a dictionary (empty if
+            not stored). columns is an OrderedDict {header: array}.
+    """
+    chunks = OrderedDict()
+    for chunk in iter_npz(path):
+        for header, col in chunk.items():
+            chunks.setdefault(header, []).append(col)
+    columns = OrderedDict()
+    for header, arrays in chunks.items():
+        columns[header] = np.concatenate(arrays)
+    return read_npz_metadata(path), columns
+
+
+def read_npz_metadata(path):
+    """
+    Reads the capture description of a file written with write_npz().
+
+    path - File path.
+    Return: Dictionary. Empty if not stored.
+    """
+    with zipfile.ZipFile(path) as zf:
+        if NPZ_METADATA not in zf.namelist():
+            return {}
+        return json.loads(zf.read(NPZ_METADATA).decode())
+
+
+def iter_npz(path):
+    """
+    Reads a file written with write_npz() chunk by chunk.
+
+    Uncompressed arrays are memory-mapped, so they are only read from disk
+    when accessed.
+
+    path - File path.
+    Return: Generator of OrderedDict {header: array}, one per chunk, in
+            the order they were written.
+    """
+    # Kept open for the compressed members: opening it reads the whole
+    # zip directory.
+    with zipfile.ZipFile(path) as zf:
+        chunks = OrderedDict()
+        for info in sorted(zf.infolist(), key=lambda i: i.filename):
+            header, _, chunk = info.filename.rpartition("/")
+            if header:
+                chunks.setdefault(chunk, []).append((header, info))
+        for chunk in sorted(chunks):
+            columns = OrderedDict()
+            for header, info in chunks[chunk]:
+                columns[header] = _read_npz_member(path, zf, info)
+            yield columns
+
+
+def _read_npz_member(path, zf, info):
+    if info.compress_type != zipfile.ZIP_STORED:
+        with zf.open(info) as f:
+            return np.lib.format.read_array(f, allow_pickle=False)
+    with open(path, "rb") as f:
+        # Skip the local file header to reach the .npy data.
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        name_len, extra_len = struct.unpack("<2H", local_header[26:30])
+        f.seek(name_len + extra_len, io.SEEK_CUR)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if not shape[0]:
+        return np.empty(shape, dtype)
+    return np.memmap(path, dtype, "r", offset, shape,
+                     "F" if fortran else "C")
+
+
+def recover_npz(path, recovered_path):
+    """
+    Salvages the members of a NPZ file whose zip directory was not
+    written, e.g. a ".part" file left by a crash (see FileWriter).
+
+    The members are found from their local headers, in the order they
+    were written, up to the first one incomplete.
+
+    path           - File path.
+    recovered_path - Path of the readable NPZ file written.
+    Return: Number of members recovered.
+    """
+    count = 0
+    with open(path, "rb") as f, \
+            zipfile.ZipFile(recovered_path, "w") as zf:
+        while True:
+            header = f.read(_LOCAL_HEADER.size)
+            if len(header) < _LOCAL_HEADER.size:
+                break
+            (signature, _, _, method, mtime, mdate, crc, compressed_size,
+             size, name_len, extra_len) = _LOCAL_HEADER.unpack(header)
+            if signature != _LOCAL_SIGNATURE:
+                # The zip directory, or garbage.
+                break
+            name = f.read(name_len).decode()
+            extra = f.read(extra_len)
+            if 0xFFFFFFFF in (compressed_size, size):
+                size, compressed_size = _get_zip64_sizes(
+                    extra, size, compressed_size)
+            data = f.read(compressed_size)
+            if len(data) < compressed_size:
+                break
+            if method == zipfile.ZIP_DEFLATED:
+                data = zlib.decompress(data, -15)
+            # The sizes and CRC are set when the member is complete.
+            if not data or len(data) != size or zlib.crc32(data) != crc:
+                break
+            date_time = ((mdate >> 9) + 1980, (mdate >> 5) & 0xF,
+                         mdate & 0x1F, mtime >> 11, (mtime >> 5) & 0x3F,
+                         (mtime & 0x1F) * 2)
+            info = zipfile.ZipInfo(name, date_time)
+            info.compress_type = method
+            zf.writestr(info, data)
+            count += 1
+    return count
+
+
+def _get_zip64_sizes(extra, size, compressed_size):
+    # The sizes not fitting in the header are in the Zip64 extra field,
+    # in this order.
+    while len(extra) >= 4:
+        tag, length = struct.unpack("<2H", extra[:4])
+        if tag == 1:
+            values = list(struct.unpack(
+                "<{}Q".format(length // 8), extra[4:4 + length // 8 * 8]))
+            if size == 0xFFFFFFFF and values:
+                size = values.pop(0)
+            if compressed_size == 0xFFFFFFFF and values:
+                compressed_size = values.pop(0)
+            break
+        extra = extra[4 + length:]
+    return size, compressed_size
+
+
+def iter_csv(path, chunk_len=65536):
+    """
+    Reads a file written with write_csv() chunk by chunk.
+
+    The padding is removed: the samples of a curve are the rows where its
+    time column is not nan.
+
+    path      - File path.
+    chunk_len - Number of rows read at once.
+    Return: Generator of OrderedDict {header: array}, one per chunk.
+    """
+    with open(path) as f:
+        headers = f.readline().rstrip("\n").split(",")[1:]
+        while True:
+            lines = list(itertools.islice(f, chunk_len))
+            if not lines:
+                return
+            rows = np.loadtxt(lines, delimiter=",", ndmin=2)
+            columns = OrderedDict()
+            for j, header in enumerate(headers):
+                if not header.startswith("time-"):
+                    continue
+                times = rows[:, j + 1]
+                valid = ~np.isnan(times)
+                columns[header] = times[valid]
+                val_header = "val-" + header[5:]
+                if val_header in headers:
+                    k = headers.index(val_header) + 1
+                    columns[val_header] = rows[valid, k]
+            yield columns
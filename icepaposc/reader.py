@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import time
+
+
+class DriverHealth:
+    """Read state of a driver."""
+
+    def __init__(self):
+        """Initializes an instance of class DriverHealth."""
+        # Read on its own connection instead of with the other drivers of
+        # its system.
+        self.isolated = False
+        # Consecutive reads in time while isolated.
+        self.successes = 0
+        # Consecutive failures while isolated.
+        self.failures = 0
+        # Monotonic time before which the driver is not read.
+        self.retry_time = 0.
+
+
+class ConcurrentReader:
+    """
+    Reads the registers of many drivers concurrently, within a timeout.
+
+    The healthy drivers of an IcePAP system are read together on the
+    connection of the system, with one query per register. When such a
+    read fails or does not complete in time, its drivers are read on
+    their own connection from then on, so that the driver at fault is
+    found and does not delay the others. A driver failing on its own
+    connection is backed off: it is not read for a time that doubles
+    with every failure. After some consecutive reads in time it is read
+    together with the others again.
+
+    The queries of a connection are serialized (by the communication lock
+    of the controller), so a read not completed in time still holds its
+    connection. It is not waited for: the drivers of the connection are
+    missed, without penalty, until it returns. Meanwhile, the drivers of
+    a held system connection are read on their own connections.
+    """
+
+    def __init__(self, read_func, addr_offset, max_workers, min_backoff=0.1,
+                 max_backoff=10., rejoin=10, release_func=None):
+        """
+        Initializes an instance of class ConcurrentReader.
+
+        read_func   - Function reading registers of an IcePAP system.
+                      read_func(n, read_groups, addr)
+                          n           - Index of the system.
+                          read_groups - Dictionary {(query, register):
+                                        [driver address]}.
+                          addr        - Driver address to read on the
+                                        connection of the driver. None to
+                                        use the connection of the system.
+                      Return: Tuple (dictionary {(query, register):
+                              {driver address: value}}, set of addresses
+                              of the drivers whose read failed).
+        addr_offset - Address offset of the drivers of each system (see
+                      Collector.ADDR_OFFSET).
+        max_workers - Max number of reads in progress.
+        min_backoff - First back off time of a failing driver [seconds].
+        max_backoff - Max back off time [seconds].
+        rejoin      - Number of consecutive reads in time needed to read
+                      an isolated driver with the others again.
+        release_func - Function closing the connection of a driver read
+                       with the others again. release_func(n, addr).
+        """
+        self.read_func = read_func
+        self.addr_offset = addr_offset
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.rejoin = rejoin
+        self.release_func = release_func
+        self.health = {}
+        self.pool = ThreadPoolExecutor(max_workers)
+        # {future: ((system index, driver address or None), set of driver
+        # addresses)} of the reads not completed in time. Their
+        # connections are held until they return.
+        self._late = {}
+        # Addresses of the drivers read on their own connection.
+        self._own = set()
+
+    def close(self):
+        """Stops the reads in progress from being waited for."""
+        self.pool.shutdown(wait=False)
+
+    def get_backed_off(self):
+        """
+        Retrieves the drivers not read because they failed.
+
+        Return: Sorted list of driver addresses.
+        """
+        now = time.monotonic()
+        held = self._get_held()
+        return sorted(addr for addr, health in list(self.health.items())
+                      if health.retry_time > now
+                      or (addr // self.addr_offset, addr) in held)
+
+    def read(self, read_groups, timeout):
+        """
+        Reads registers of several drivers.
+
+        read_groups - Dictionary {(query, register): [driver address]}.
+        timeout     - Max time to wait for the reads [seconds].
+        Return: Tuple (dictionary {(query, register): {driver address:
+                value}}, set of addresses of the drivers missed).
+        """
+        self._collect_late()
+        held = self._get_held()
+        now = time.monotonic()
+        # {(system index, driver address or None): read_groups}
+        tasks = {}
+        for reg, addrs in read_groups.items():
+            for addr in addrs:
+                health = self.health.get(addr)
+                if health is None:
+                    health = self.health[addr] = DriverHealth()
+                if health.retry_time > now:
+                    continue
+                n = addr // self.addr_offset
+                key = (n, None)
+                if health.isolated or key in held:
+                    key = (n, addr)
+                    self._own.add(addr)
+                elif addr in self._own:
+                    self._own.discard(addr)
+                    if self.release_func:
+                        self.release_func(n, addr)
+                if key in held:
+                    continue
+                tasks.setdefault(key, {}).setdefault(reg, []).append(addr)
+        futures = {}
+        for key, groups in tasks.items():
+            addrs = set(a for reg_addrs in groups.values() for a in reg_addrs)
+            future = self.pool.submit(self.read_func, key[0], groups, key[1])
+            futures[future] = (key, addrs)
+        deadline = time.monotonic() + timeout
+        snapshot = {}
+        for future, (key, addrs) in futures.items():
+            own = key[1] is not None
+            try:
+                values, failed = future.result(
+                    max(deadline - time.monotonic(), 0.))
+            except TimeoutError:
+                # A read still waiting for a worker is not at fault.
+                if not future.cancel():
+                    self._late[future] = (key, addrs)
+                    self._penalize(addrs, own)
+                continue
+            except Exception as e:
+                print('Failed to read drivers {}\n{}'.format(sorted(addrs), e))
+                values, failed = {}, addrs
+            for reg, reg_values in values.items():
+                snapshot.setdefault(reg, {}).update(reg_values)
+            self._completed(addrs, failed, own)
+        missed = set(addr for reg, addrs in read_groups.items()
+                     for addr in addrs if addr not in snapshot.get(reg, ()))
+        return snapshot, missed
+
+    def _get_held(self):
+        # The connections of the late reads.
+        return set(key for key, _ in list(self._late.values()))
+
+    def _collect_late(self):
+        # The values of the late reads are too old to be used.
+        for future in [f for f in self._late if f.done()]:
+            del self._late[future]
+
+    def _completed(self, addrs, failed, own):
+        if failed:
+            self._penalize(failed, own)
+        for addr in addrs - set(failed):
+            health = self.health[addr]
+            if not health.isolated:
+                continue
+            health.failures = 0
+            health.successes += 1
+            if health.successes >= self.rejoin:
+                health.isolated = False
+
+    def _penalize(self, addrs, own):
+        now = time.monotonic()
+        for addr in addrs:
+            health = self.health[addr]
+            health.successes = 0
+            health.isolated = True
+            if not own:
+                # The driver at fault is unknown. Find it by reading the
+                # drivers on their own.
+                continue
+            backoff = self.min_backoff * 2 ** min(health.failures, 16)
+            health.retry_time = now + min(backoff, self.max_backoff)
+            health.failures += 1
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+import argparse
+import sys
+import time
+import numpy as np
+from . import version
+from .collector import Collector
+from .export import get_capture_path, get_columns, get_metadata
+from .sample_buffer import SampleBuffer
+from .settings import Settings
+from .simulator import add_simulator_arguments, get_simulator
+from .trigger import TriggerEngine, add_trigger_arguments, \
+    get_capture_job, get_triggers
+from .writer import FileWriter
+
+
+class Track:
+    """The samples of a recorded signal not written to file yet."""
+
+    def __init__(self, subscription_id, driver_addr, sig_name, y_axis):
+        """
+        Initializes an instance of class Track.
+
+        subscription_id - Subscription id.
+        driver_addr     - IcePAP driver address.
+        sig_name        - Signal name.
+        y_axis          - Y axis the signal is meant to be plotted against.
+        """
+        self.subscription_id = subscription_id
+        self.driver_addr = driver_addr
+        self.signal_name = sig_name
+        self.y_axis = y_axis
+        self.buffer = SampleBuffer()
+        # Absolute index of the first sample not saved yet.
+        self.save_mark = 0
+
+    @property
+    def array_time(self):
+        """Array with the time of the collected samples."""
+        return self.buffer.times
+
+    @property
+    def array_val(self):
+        """Array with the value of the collected samples."""
+        return self.buffer.values
+
+
+class Recorder:
+    """Records IcePAP signals to file, without GUI."""
+
+    def __init__(self, host, port, timeout, settings, siglist,
+                 backend=None, triggers=None):
+        """
+        Initializes an instance of class Recorder.
+
+        host     - IcePAP system address.
+        port     - IcePAP system port number.
+        timeout  - Socket timeout.
+        settings - An instance of class Settings. The auto save settings
+                   select the files written.
+        siglist  - List of signals to record.
+                     Element Syntax: <driver>:<signal name>:<Y-axis>
+        backend  - Connection to the IcePAP system (see Collector).
+        triggers - List of Trigger. If not empty, only a time window
+                   around each event is written, to a file per event
+                   (see the trigger settings).
+        """
+        self.settings = settings
+        self.tracks = []
+        self.collector = Collector(host, port, timeout, settings,
+                                   self.callback_collect, event_loop=False,
+                                   backend=backend)
+        try:
+            for sig in siglist:
+                lst = sig.split(':')
+                if len(lst) != 3:
+                    msg = 'Bad format of signal "{}".\n' \
+                          'It should be: ' \
+                          '<driver>:<signal name>:<Y-axis>'.format(sig)
+                    raise Exception(msg)
+                addr = int(lst[0])
+                subscription_id = self.collector.subscribe(addr, lst[1])
+                self.tracks.append(Track(subscription_id, addr, lst[1],
+                                         int(lst[2])))
+            self.trigger_engine = None
+            if triggers:
+                for trigger in triggers:
+                    if not self._get_track(trigger.driver_addr,
+                                           trigger.signal_name):
+                        msg = 'The signal of trigger {} is not ' \
+                              'recorded.'.format(trigger)
+                        raise Exception(msg)
+                self.trigger_engine = TriggerEngine(
+                    triggers, settings.pre_trigger, settings.post_trigger,
+                    self._save_capture)
+                self.collector.set_trigger_engine(self.trigger_engine)
+        except Exception:
+            self.collector.close()
+            raise
+        self._writer = FileWriter(max_size=settings.max_file_size * 1048576)
+        self._writer.start()
+        self._file_path = None
+        self._file_time = None
+        self._idx = 0
+        self.rows = 0
+
+    def callback_collect(self, subscription_id, value_list):
+        """
+        Callback function that stores the data collected from IcePAP.
+
+        subscription_id - Subscription id.
+        value_list - List of tuples (time, value).
+        """
+        if self.trigger_engine:
+            # Only the captures around the events are written.
+            return
+        data = np.asarray(value_list, dtype=np.float64)
+        for track in self.tracks:
+            if track.subscription_id == subscription_id:
+                track.buffer.append(data[:, 0], data[:, 1])
+
+    def run(self, duration=0):
+        """
+        Records until the duration elapses or Ctrl-C is pressed.
+
+        duration - Recording time [seconds]. 0 for no limit.
+        """
+        for track in self.tracks:
+            self.collector.start(track.subscription_id)
+        start = time.monotonic()
+        next_flush = start + self.settings.flush_interval
+        poll_period = self.settings.sample_rate * self.settings.dump_rate
+        poll_period = max(poll_period / 1000., 0.01)
+        try:
+            while not duration or time.monotonic() - start < duration:
+                time.sleep(poll_period)
+                self.collector.poll()
+                if time.monotonic() >= next_flush:
+                    self.flush()
+                    next_flush += self.settings.flush_interval
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def flush(self, use_new_file=False):
+        """
+        Hands the samples collected since the previous call to the writer.
+
+        use_new_file - If True, the next samples go to a new file.
+        """
+        if self.trigger_engine:
+            return
+        columns = get_columns(self.tracks,
+                              [t.save_mark for t in self.tracks])
+        rows = max(len(col) for _, col in columns)
+        if rows:
+            if self._file_path is None:
+                self._set_new_file_path()
+            metadata = get_metadata(self.collector, self.tracks,
+                                    self.settings)
+            precision = self.settings.csv_precision or None
+            job = FileWriter.Job(self._file_path, columns, self._idx,
+                                 precision, metadata, self.settings.compress)
+            # Nobody is waiting for the recorder. Never drop data.
+            self._writer.submit(job, block=True)
+            self._idx += rows
+            self.rows += rows
+            for i, track in enumerate(self.tracks):
+                track.save_mark += len(columns[2 * i][1])
+                # The views handed to the writer stay valid.
+                saved = track.save_mark - track.buffer.first_index
+                track.buffer.drop(saved)
+        if self._file_path is None:
+            return
+        file_age = time.time() - self._file_time
+        if not self.settings.use_append and \
+                file_age >= 60 * self.settings.as_interval:
+            use_new_file = True
+        if use_new_file:
+            self._writer.close_file()
+            self._file_path = None
+
+    def close(self):
+        """Stops the acquisition and completes the file."""
+        self.collector.close()
+        self.collector.poll()
+        if self.trigger_engine:
+            # Save the capture in progress, shorter.
+            self.trigger_engine.complete()
+        self.flush(True)
+        self._writer.stop()
+
+    def get_statistics(self):
+        """
+        Retrieves the timing statistics of the acquisition.
+
+        Return: Dictionary (see Collector.get_statistics()).
+        """
+        return self.collector.get_statistics()
+
+    def _get_track(self, addr, sig_name):
+        for track in self.tracks:
+            if track.driver_addr == addr and track.signal_name == sig_name:
+                return track
+        return None
+
+    def _save_capture(self, capture):
+        for ct in capture.tracks:
+            ct.y_axis = self._get_track(ct.driver_addr,
+                                        ct.signal_name).y_axis
+        job = get_capture_job(capture, self.collector, self.settings)
+        self._writer.submit(job, block=True)
+        self._writer.close_file()
+        self.rows += max([len(ct.array_time) for ct in capture.tracks] + [0])
+        print('Trigger {} at {}. Capture saved to {}'.format(
+            capture.trigger, time.strftime('%H:%M:%S',
+                                           time.localtime(capture.time)),
+            job.path))
+
+    def _set_new_file_path(self):
+        self._idx = 0
+        self._file_time = time.time()
+        self._file_path = get_capture_path(self.settings.as_folder,
+                                           self.settings.as_format)
+        print('Recording to {}'.format(self._file_path))
+
+
+def get_parser():
+    desc = 'IcePAP signal recorder, without GUI.\n'
+    desc += 'Version: {}.\n'.format(version)
+    desc += 'The auto save settings of icepaposc select the files written.'
+    epi = 'Copyright 2017:\n' \
+          '   MAX IV Laboratory, Lund, Sweden\n' \
+          '   CELLS / ALBA Synchrotron, Bellaterra, Spain.'
+    fmt = argparse.RawTextHelpFormatter
+    parse = argparse.ArgumentParser(description=desc,
+                                    formatter_class=fmt,
+                                    epilog=epi)
+    ver = '%(prog)s {0}'.format(version)
+
+    parse.add_argument('--version', action='version', version=ver)
+
+    parse.add_argument('host', nargs='?',
+                       help='IcePAP Host. Several systems: '
+                            '<host>[:<port>],<host>[:<port>]...')
+    add_simulator_arguments(parse)
+    parse.add_argument('-p', '--port', type=int, default=5000,
+                       help='IcePAP port')
+    parse.add_argument('-t', '--timeout', type=int, default=3,
+                       help='Socket timeout')
+    parse.add_argument('-s', '--sig', nargs='+', required=True,
+                       help='Signals to record '
+                            '<driver>:<signal name>:<Y-axis>')
+    parse.add_argument('-r', '--period', type=float,
+                       help='Sample period [milliseconds]')
+    parse.add_argument('-d', '--duration', type=float, default=0,
+                       help='Recording time [seconds]. Default: until '
+                            'Ctrl-C')
+    parse.add_argument('-f', '--folder', help='Output folder')
+    parse.add_argument('--format', choices=['csv', 'npz'],
+                       help='Output file format')
+    add_trigger_arguments(parse)
+    parse.add_argument('--pre', type=float,
+                       help='Time captured before each trigger event '
+                            '[seconds]')
+    parse.add_argument('--post', type=float,
+                       help='Time captured after each trigger event '
+                            '[seconds]')
+
+    return parse
+
+
+def main():
+    parser = get_parser()
+    args = parser.parse_args()
+    if args.host is None:
+        if not args.simulate:
+            parser.error('the host is required unless --simulate is used')
+        args.host = 'simulator'
+
+    settings = Settings()
+    if args.period:
+        settings.sample_rate = args.period
+    if args.folder:
+        settings.as_folder = args.folder
+    if args.format:
+        settings.as_format = args.format
+    if args.pre is not None:
+        settings.pre_trigger = args.pre
+    if args.post is not None:
+        settings.post_trigger = args.post
+    try:
+        triggers = get_triggers(args)
+    except Exception as e:
+        parser.error(e)
+    try:
+        recorder = Recorder(args.host, args.port, args.timeout, settings,
+                            args.sig, get_simulator(args), triggers)
+    except Exception as e:
+        print('Failed to start recording.\n{}'.format(e))
+        sys.exit(1)
+    recorder.run(args.duration)
+    stats = recorder.get_statistics()
+    print('Recorded {} rows. Sample rate: {:.1f} Hz. Overruns: {} ({} '
+          'skipped). Dropped: {}.'.format(recorder.rows, stats['rate'],
+                                          stats['overruns'],
+                                          stats['skipped'],
+                                          stats['dropped']))
+    print('Register values read: {}. Reads served from them: {}.'.format(
+        stats['cache_misses'], stats['cache_hits']))
+    if stats['missed']:
+        print('Driver reads missed: {}.'.format(
+            ', '.join('{} ({})'.format(addr, count) for addr, count
+                      in sorted(stats['missed'].items()))))
+
+
+if __name__ == "__main__":
+    main()
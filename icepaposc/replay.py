@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+from PyQt5 import QtCore
+from collections import OrderedDict
+import itertools
+import os
+import zipfile
+import numpy as np
+from .channel import Channel
+from .derived import STATUS_FIELDS, decode_status
+from .export import iter_csv, iter_npz, read_npz_metadata, recover_npz
+
+
+class Replay:
+    """
+    Feeds a subscriber with the signal data of a saved capture.
+
+    It replaces the Collector when there is no IcePAP connection. The
+    capture is loaded chunk by chunk from the Qt event loop, so the
+    curves are displayed while a large file is being read. Only the last
+    chunk is kept: a signal subscribed later gets the previous ones read
+    again from the file. The Stat* signals of the drivers with a recorded
+    StatWord are decoded from it.
+    """
+
+    def __init__(self, path, settings, callback):
+        """
+        Initializes an instance of class Replay.
+
+        path     - Capture file (CSV or NPZ). A ".part" file left by a
+                   crash is read as far as possible. The members of a NPZ
+                   one without zip directory are first salvaged to
+                   "<name>_recovered.npz" (see recover_npz()).
+        settings - An instance of class Settings.
+        callback - A callback function used for sending the signal data
+                   back to the caller (see Collector).
+        """
+        self.path = path
+        self.settings = settings
+        self.cb = callback
+        self.metadata = {}
+        if self._is_npz(path):
+            try:
+                self.metadata = self._read_npz_metadata()
+                self.chunks = self._iter_chunks()
+            except Exception as e:
+                msg = 'Failed to open capture {}\n{}'.format(path, e)
+                raise Exception(msg)
+        else:
+            if not os.path.isfile(path):
+                msg = 'Capture file {} not found.'.format(path)
+                raise Exception(msg)
+            self.chunks = self._iter_chunks()
+        # Number of chunks loaded, and the last one.
+        self.loaded = 0
+        self.last_chunk = None
+        self.host = self.metadata.get('host', os.path.basename(path))
+        self.port = self.metadata.get('port', 0)
+
+        # The curves of the capture: {(driver, signal): number of samples
+        # loaded}.
+        self.curves = OrderedDict()
+        self.sig_list = []
+        for curve in self.metadata.get('curves', []):
+            self._add_curve(curve['driver'], curve['signal'])
+        self.channels_subscribed = {}
+        self.channels = {}
+        self.channel_id = 0
+        self.end_time = 0.
+        self.done = False
+
+        self.ticker = QtCore.QTimer()
+        self.ticker.timeout.connect(self._load_chunk)
+        self._load_chunk()
+        self.ticker.start(0)
+
+    def close(self):
+        """Stops loading the capture."""
+        self.ticker.stop()
+        self.chunks.close()
+
+    def get_curves(self):
+        """
+        Retrieves the curves found in the capture so far.
+
+        Return: List of tuples (driver address, signal name, Y axis).
+        """
+        y_axes = {}
+        for curve in self.metadata.get('curves', []):
+            y_axes[(curve['driver'], curve['signal'])] = curve['y_axis']
+        return [(addr, sig, y_axes.get((addr, sig), 1))
+                for addr, sig in self.curves]
+
+    def get_available_drivers(self):
+        """
+        Retrieves the drivers in the capture.
+
+        Return: List of driver addresses.
+        """
+        return sorted(set(addr for addr, _ in self.curves))
+
+    def get_available_signals(self, icepap_addr=None):
+        """
+        Retrieves the signal names in the capture.
+
+        icepap_addr - Driver address. If given, only the signals of the
+                      driver.
+        Return: List of signal names.
+        """
+        if icepap_addr is None:
+            return self.sig_list
+        names = set(sig for addr, sig in self.curves if addr == icepap_addr)
+        if 'StatWord' in names:
+            names.update(STATUS_FIELDS)
+        return [sig for sig in self.sig_list if sig in names]
+
+    def get_signal_index(self, signal_name):
+        """
+        Retrieves the fixed index of a signal from its name.
+
+        Return: Signal index.
+        """
+        return self.sig_list.index(signal_name)
+
+    def get_channel(self, subscription_id):
+        """
+        Retrieves the channel of a subscription.
+
+        subscription_id - The given subscription id.
+        Return: Channel instance. None if not subscribed.
+        """
+        return self.channels_subscribed.get(subscription_id)
+
+    def get_statistics(self):
+        """
+        Retrieves the acquisition statistics (see Collector). All zero.
+
+        Return: Dictionary.
+        """
+        return {'rate': 0., 'jitter_p50': 0., 'jitter_p99': 0.,
+                'overruns': 0, 'skipped': 0, 'ticks': 0, 'dropped': 0,
+                'driver_time': {}, 'missed': {}, 'backed_off': [],
+                'cache_hits': 0, 'cache_misses': 0}
+
+    def reset_statistics(self):
+        """Clears the acquisition statistics."""
+        pass
+
+    def get_current_time(self):
+        """
+        Retrieves the current time.
+
+        Return: Time of the newest sample loaded so far.
+        """
+        return self.end_time
+
+    def subscribe(self, icepap_addr, signal_name):
+        """
+        Creates a new subscription for signal values.
+
+        icepap_addr - IcePAP driver number.
+        signal_name - Signal name.
+        Return - A positive integer id used when unsubscribing.
+        """
+        for ch in list(self.channels_subscribed.values()):
+            if ch.equals(icepap_addr, signal_name):
+                msg = 'Channel already exists.\nAddr: ' \
+                      '{}\nSignal: {}'.format(icepap_addr, signal_name)
+                raise Exception(msg)
+        if self._get_source(icepap_addr, signal_name) is None:
+            msg = 'Signal {} of driver {} is not in the ' \
+                  'capture.'.format(signal_name, icepap_addr)
+            raise Exception(msg)
+        channel = Channel(icepap_addr, signal_name)
+        for curve in self.metadata.get('curves', []):
+            if curve['driver'] == icepap_addr and \
+                    curve['signal'] == signal_name:
+                channel.measure_resolution = curve['measure_resolution']
+        self.channel_id += 1
+        self.channels_subscribed[self.channel_id] = channel
+        return self.channel_id
+
+    def start(self, subscription_id):
+        """
+        Sends the data loaded so far for a subscription, and the rest as
+        it is loaded.
+
+        subscription_id - The given subscription id.
+        """
+        if subscription_id in self.channels_subscribed and \
+                subscription_id not in self.channels:
+            channel = self.channels_subscribed[subscription_id]
+            self.channels[subscription_id] = channel
+            key = self._get_source(channel.icepap_address, channel.sig_name)
+            if not self.curves[key]:
+                return
+            chunks = itertools.islice(self._iter_chunks(), self.loaded - 1)
+            try:
+                for columns in itertools.chain(chunks, [self.last_chunk]):
+                    times, values = self._get_curve_columns(columns, key)
+                    if times is not None and len(times):
+                        self.cb(subscription_id,
+                                self._get_samples(channel, times, values))
+            except Exception as e:
+                print('Failed to read capture {}\n{}'.format(self.path, e))
+
+    def unsubscribe(self, subscription_id):
+        """
+        Terminates a subscription.
+
+        subscription_id - The given subscription id.
+        """
+        self.channels.pop(subscription_id, None)
+        self.channels_subscribed.pop(subscription_id, None)
+
+    def _iter_chunks(self):
+        if self._is_npz(self.path):
+            return iter_npz(self.path)
+        return iter_csv(self.path)
+
+    @staticmethod
+    def _is_npz(path):
+        path = path.lower()
+        if path.endswith('.part'):
+            path = path[:-len('.part')]
+        return path.endswith('.npz')
+
+    def _read_npz_metadata(self):
+        try:
+            return read_npz_metadata(self.path)
+        except zipfile.BadZipFile:
+            if not self.path.lower().endswith('.part'):
+                raise
+        # Written until a crash, without zip directory.
+        root = os.path.splitext(self.path[:-len('.part')])[0]
+        recovered_path = root + '_recovered.npz'
+        count = recover_npz(self.path, recovered_path)
+        print('Recovered {} members of capture {} to {}'.format(
+            count, self.path, recovered_path))
+        self.path = recovered_path
+        return read_npz_metadata(self.path)
+
+    @staticmethod
+    def _get_curve_columns(columns, key):
+        """
+        Finds the samples of a curve in a chunk.
+
+        columns - Chunk. OrderedDict {header: array}.
+        key     - Tuple (driver address, signal name).
+        Return: Tuple of arrays (times, values). (None, None) if the curve
+                is not in the chunk.
+        """
+        name = '{}-{}'.format(*key)
+        return columns.get('time-' + name), columns.get('val-' + name)
+
+    def _add_curve(self, addr, sig):
+        if (addr, sig) not in self.curves:
+            self.curves[(addr, sig)] = 0
+        if sig not in self.sig_list:
+            self.sig_list.append(sig)
+        if sig == 'StatWord':
+            for name in STATUS_FIELDS:
+                if name not in self.sig_list:
+                    self.sig_list.append(name)
+
+    def _get_source(self, addr, sig):
+        """
+        Finds the curve of the capture a signal is read from.
+
+        addr - Driver address.
+        sig  - Signal name.
+        Return: Key of the curve in self.curves. None if not available.
+        """
+        if (addr, sig) in self.curves:
+            return addr, sig
+        if sig in STATUS_FIELDS and (addr, 'StatWord') in self.curves:
+            return addr, 'StatWord'
+        return None
+
+    def _get_samples(self, channel, times, values):
+        if channel.sig_name in STATUS_FIELDS and \
+                (channel.icepap_address, channel.sig_name) not in self.curves:
+            values = decode_status(values, channel.sig_name)
+        return np.column_stack((times, values))
+
+    def _load_chunk(self):
+        try:
+            columns = next(self.chunks)
+        except StopIteration:
+            self.ticker.stop()
+            self.done = True
+            return
+        except Exception as e:
+            print('Failed to read capture {}\n{}'.format(self.path, e))
+            self.ticker.stop()
+            self.done = True
+            return
+        self.loaded += 1
+        self.last_chunk = columns
+        for header, times in columns.items():
+            if not header.startswith('time-'):
+                continue
+            # Header: time-<driver>-<signal>
+            addr, sig = header[5:].split('-', 1)
+            addr = int(addr)
+            self._add_curve(addr, sig)
+            if not len(times):
+                continue
+            values = columns['val-' + header[5:]]
+            self.curves[(addr, sig)] += len(times)
+            self.end_time = max(self.end_time, float(times[-1]))
+            for subscription_id, channel in self.channels.items():
+                source = self._get_source(channel.icepap_address,
+                                          channel.sig_name)
+                if source == (addr, sig):
+                    self.cb(subscription_id,
+                            self._get_samples(channel, times, values))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+import os
+import tempfile
+import numpy as np
+
+
+class SampleBuffer:
+    """Growable storage for the (time, value) samples of a signal."""
+
+    # Memory used by one (time, value) sample [bytes].
+    SAMPLE_NBYTES = 16
+
+    def __init__(self, capacity=1024):
+        """
+        Initializes an instance of class SampleBuffer.
+
+        capacity - Number of samples preallocated.
+        """
+        self._capacity = capacity
+        self._time, self._val = self._allocate(capacity)
+        self._start = 0
+        self._end = 0
+        # Number of samples dropped so far, i.e. the absolute index of the
+        # first stored sample.
+        self.first_index = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def times(self):
+        """Array view (no copy) of the sample times."""
+        return self._time[self._start:self._end]
+
+    @property
+    def values(self):
+        """Array view (no copy) of the sample values."""
+        return self._val[self._start:self._end]
+
+    @property
+    def end_index(self):
+        """Absolute index of the next sample to be appended."""
+        return self.first_index + len(self)
+
+    @property
+    def nbytes(self):
+        """Memory allocated by the buffer [bytes]."""
+        return self._time.nbytes + self._val.nbytes
+
+    def append(self, times, values):
+        """
+        Appends samples.
+
+        times  - Array like with the sample times.
+        values - Array like with the sample values.
+        """
+        n = len(times)
+        if self._end + n > len(self._time):
+            self._reallocate(len(self) + n)
+        self._time[self._end:self._end + n] = times
+        self._val[self._end:self._end + n] = values
+        self._end += n
+
+    def drop(self, n):
+        """
+        Removes the oldest samples.
+
+        n - Number of samples to remove.
+        """
+        n = min(n, len(self))
+        self._start += n
+        self.first_index += n
+
+    def compact(self):
+        """
+        Releases the memory of the dropped samples, if the buffer
+        allocates more than twice the memory of the samples stored.
+        """
+        if len(self._time) > 2 * max(len(self), self._capacity):
+            self._reallocate(len(self))
+
+    def clear(self):
+        """Removes all the samples and releases their memory."""
+        self.first_index += len(self)
+        self._time, self._val = self._allocate(self._capacity)
+        self._start = 0
+        self._end = 0
+
+    def close(self):
+        """Releases the storage. The buffer must not be used afterwards."""
+        self._time = self._val = None
+
+    def _allocate(self, capacity):
+        """
+        Creates the storage for a number of samples.
+
+        capacity - Number of samples.
+        Return: Tuple of arrays (times, values).
+        """
+        return (np.empty(capacity, dtype=np.float64),
+                np.empty(capacity, dtype=np.float64))
+
+    def _reallocate(self, size):
+        # Twice the needed size keeps the cost of appending amortized
+        # constant, and shrinks the buffer after old samples were dropped.
+        # Stored samples are never overwritten in place, so the views
+        # handed out stay valid (they just do not see later changes).
+        capacity = max(self._capacity, 2 * size)
+        new_time, new_val = self._allocate(capacity)
+        n = len(self)
+        new_time[:n] = self.times
+        new_val[:n] = self.values
+        self._time = new_time
+        self._val = new_val
+        self._start = 0
+        self._end = n
+
+
+class MappedSampleBuffer(SampleBuffer):
+    """
+    SampleBuffer storing the samples in memory-mapped files.
+
+    The operating system keeps the recently used pages (the newest
+    samples) in RAM and reads the older ones from disk only when they are
+    accessed, so the history is not limited by the RAM size.
+    """
+
+    def __init__(self, folder, capacity=1024):
+        """
+        Initializes an instance of class MappedSampleBuffer.
+
+        folder   - Folder where the files are created.
+        capacity - Number of samples preallocated.
+        """
+        self.folder = folder
+        self._paths = []
+        # Replaced files that could not be removed yet (still mapped).
+        self._stale = []
+        SampleBuffer.__init__(self, capacity)
+
+    @property
+    def nbytes(self):
+        """Memory allocated by the buffer [bytes]. Mapped files excluded."""
+        return 0
+
+    @property
+    def disk_nbytes(self):
+        """Disk space allocated by the buffer [bytes]."""
+        return self._time.nbytes + self._val.nbytes
+
+    def close(self):
+        """Releases the storage. The buffer must not be used afterwards."""
+        SampleBuffer.close(self)
+        self._remove_files(self._paths)
+        self._paths = []
+
+    def _allocate(self, capacity):
+        arrays = []
+        paths = []
+        for _ in range(2):
+            fd, path = tempfile.mkstemp(suffix='.f64', dir=self.folder)
+            os.close(fd)
+            arrays.append(np.memmap(path, dtype=np.float64, mode='w+',
+                                    shape=(capacity,)))
+            paths.append(path)
+        # The views handed out keep the old mappings alive. Their files
+        # can be unlinked right away, except on Windows (retried later).
+        self._remove_files(self._paths)
+        self._paths = paths
+        return arrays[0], arrays[1]
+
+    def _remove_files(self, paths):
+        stale = []
+        for path in self._stale + paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                stale.append(path)
+        self._stale = stale
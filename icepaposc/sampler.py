@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+from collections import deque
+from threading import Thread, Event
+
+
+class Sampler(Thread):
+    """Runs the signal acquisition in its own thread."""
+
+    def __init__(self, acquire, scheduler, queue_len=10000):
+        """
+        Initializes an instance of class Sampler.
+
+        acquire   - Function reading one sample of every active channel.
+                    Its return value is pushed to the queue as is.
+        scheduler - Scheduler instance pacing the acquisitions.
+        queue_len - Max number of acquisitions kept in the queue. When
+                    full, the oldest acquisition is dropped.
+        """
+        Thread.__init__(self, name='IcepapOSC sampler')
+        self.daemon = True
+        self.acquire = acquire
+        self.scheduler = scheduler
+        # Appending and popping from both ends of a deque are atomic
+        # operations, so no lock is needed between producer and consumer.
+        self.queue = deque(maxlen=queue_len)
+        self.dropped = 0
+        self._stop_event = Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.scheduler.tick_started()
+            samples = self.acquire()
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(samples)
+            self._stop_event.wait(self.scheduler.next_delay())
+
+    def stop(self, timeout=None):
+        """
+        Stops the acquisition and waits for the thread to finish.
+
+        timeout - Max time to wait [seconds]. None waits forever.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def take(self):
+        """
+        Retrieves all the acquisitions queued so far.
+
+        Return: List of acquisitions, oldest first.
+        """
+        items = []
+        while True:
+            try:
+                items.append(self.queue.popleft())
+            except IndexError:
+                return items
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+from collections import deque
+from threading import Lock
+import math
+import time
+
+
+class TickStatistics:
+    """Timing statistics of the acquisition ticks."""
+
+    def __init__(self, window=1000):
+        """
+        Initializes an instance of class TickStatistics.
+
+        window - Number of recent ticks used for the rate and jitter.
+        """
+        self.lock = Lock()
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        """Clears all the statistics."""
+        with self.lock:
+            self.tick_times = deque(maxlen=self.window)
+            self.jitters = deque(maxlen=self.window)
+            self.ticks = 0
+            self.overruns = 0
+            self.skipped = 0
+            self.driver_time = {}
+            self.missed = {}
+            self.cache_hits = 0
+            self.cache_misses = 0
+
+    def add_tick(self, tick_time, jitter):
+        """
+        Registers the start of a tick.
+
+        tick_time - Monotonic time when the tick started [seconds].
+        jitter    - Delay of the tick with respect to its deadline [seconds].
+        """
+        with self.lock:
+            self.tick_times.append(tick_time)
+            self.jitters.append(jitter)
+            self.ticks += 1
+
+    def add_overrun(self, skipped):
+        """
+        Registers a tick that did not finish before the next deadline.
+
+        skipped - Number of deadlines given up.
+        """
+        with self.lock:
+            self.overruns += 1
+            self.skipped += skipped
+
+    def add_driver_time(self, addr, elapsed):
+        """
+        Accumulates the time spent reading a driver.
+
+        addr    - IcePAP driver address.
+        elapsed - Time spent [seconds].
+        """
+        with self.lock:
+            self.driver_time[addr] = self.driver_time.get(addr, 0) + elapsed
+
+    def add_missed(self, addrs):
+        """
+        Registers the drivers not read in a tick.
+
+        addrs - IcePAP driver addresses.
+        """
+        with self.lock:
+            for addr in addrs:
+                self.missed[addr] = self.missed.get(addr, 0) + 1
+
+    def add_reads(self, hits, misses):
+        """
+        Accumulates the register reads of a tick.
+
+        hits   - Number of reads served from the values of the tick.
+        misses - Number of values read from the controller.
+        """
+        with self.lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+
+    @staticmethod
+    def _percentile(values, p):
+        if not values:
+            return 0.
+        idx = int(math.ceil(p / 100. * len(values))) - 1
+        return values[max(idx, 0)]
+
+    def get(self):
+        """
+        Retrieves a summary of the statistics.
+
+        Return: Dictionary with the keys
+                rate        - Achieved tick rate [Hz].
+                jitter_p50  - Median tick delay [milliseconds].
+                jitter_p99  - 99th percentile of the tick delay
+                              [milliseconds].
+                overruns    - Number of ticks that exceeded their period.
+                skipped     - Number of deadlines given up.
+                ticks       - Number of ticks.
+                driver_time - Dictionary {driver address: mean read time
+                              per tick [milliseconds]}.
+                missed      - Dictionary {driver address: number of ticks
+                              it was not read in}.
+                cache_hits  - Number of register reads served from the
+                              values already read in the tick.
+                cache_misses - Number of register values read from the
+                               controller.
+        """
+        with self.lock:
+            rate = 0.
+            if len(self.tick_times) > 1:
+                span = self.tick_times[-1] - self.tick_times[0]
+                if span > 0:
+                    rate = (len(self.tick_times) - 1) / span
+            jitters = sorted(self.jitters)
+            ticks = max(self.ticks, 1)
+            driver_time = {}
+            for addr, elapsed in self.driver_time.items():
+                driver_time[addr] = 1000. * elapsed / ticks
+            return {'rate': rate,
+                    'jitter_p50': 1000. * self._percentile(jitters, 50),
+                    'jitter_p99': 1000. * self._percentile(jitters, 99),
+                    'overruns': self.overruns,
+                    'skipped': self.skipped,
+                    'ticks': self.ticks,
+                    'driver_time': driver_time,
+                    'missed': dict(self.missed),
+                    'cache_hits': self.cache_hits,
+                    'cache_misses': self.cache_misses}
+
+
+class Scheduler:
+    """Fixed rate scheduler targeting absolute deadlines."""
+
+    def __init__(self, get_period, statistics, catch_up=False,
+                 max_catch_up=10):
+        """
+        Initializes an instance of class Scheduler.
+
+        get_period   - Function returning the period [milliseconds].
+        statistics   - TickStatistics instance to report to.
+        catch_up     - If True, the ticks missed during an overrun are run
+                       back to back. If False, they are skipped.
+        max_catch_up - Max number of missed ticks to catch up with. Longer
+                       overruns are always skipped.
+        """
+        self.get_period = get_period
+        self.statistics = statistics
+        self.catch_up = catch_up
+        self.max_catch_up = max_catch_up
+        self.deadline = None
+
+    def tick_started(self):
+        """Must be called at the beginning of every tick."""
+        now = time.monotonic()
+        if self.deadline is None:
+            self.deadline = now
+        self.statistics.add_tick(now, max(now - self.deadline, 0.))
+
+    def next_delay(self):
+        """
+        Must be called at the end of every tick.
+
+        Return: Time to wait until the next tick [seconds].
+        """
+        period = self.get_period() / 1000.
+        self.deadline += period
+        now = time.monotonic()
+        if now <= self.deadline:
+            return self.deadline - now
+        missed = int(math.floor((now - self.deadline) / period)) + 1
+        if self.catch_up and missed <= self.max_catch_up:
+            self.statistics.add_overrun(0)
+            return 0.
+        # Give up the missed deadlines and stay on the original grid.
+        self.deadline += missed * period
+        self.statistics.add_overrun(missed)
+        return self.deadline - now
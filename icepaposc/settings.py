@@ -36,22 +36,51 @@ class Settings:
         self.sample_rate_max = 1000  # [milliseconds]
         self.dump_rate_min = 1
         self.dump_rate_max = 100
+        self.read_timeout_min = 10  # [milliseconds]
+        self.read_timeout_max = 10000  # [milliseconds]
 
         # Settings for GUI.
         self.default_x_axis_len_min = 5  # [Seconds]
         self.default_x_axis_len_max = 3600  # [Seconds]
+        self.max_fps_min = 1  # [Frames per second]
+        self.max_fps_max = 100  # [Frames per second]
 
         # Settings for auto save.
         self.as_interval_min = 1  # [Minutes]
         self.as_interval_max = 24 * 60  # [Minutes]
+        self.flush_interval_min = 1  # [Seconds]
+        self.flush_interval_max = 3600  # [Seconds]
+        self.as_formats = ['csv', 'npz']
+
+        # Settings for triggers.
+        self.trigger_window_min = 0  # [Seconds]
+        self.trigger_window_max = 3600  # [Seconds]
 
         self.sample_rate = 0
         self.dump_rate = 0
+        self.use_thread = True
+        self.catch_up = False
+        self.read_timeout = 200  # [milliseconds]
         self.default_x_axis_len = 0
+        self.max_fps = 25  # [Frames per second]
         self.use_auto_save = False
         self.use_append = False
         self.as_interval = 5  # [Minutes]
         self.as_folder = user_path
+        self.flush_interval = 10  # [Seconds]
+        self.max_file_size = 0  # [MB] 0 = unlimited
+        self.as_format = 'csv'
+        self.compress = False  # NPZ only
+        self.csv_precision = 0  # [Significant digits] 0 = full precision
+        self.max_age = 0  # [Seconds] 0 = unlimited
+        self.max_samples = 0  # Per curve. 0 = unlimited
+        self.memory_budget = 0  # [MB] For all curves. 0 = unlimited
+        self.retain_unsaved = True
+        self.history_on_disk = False
+        self.pre_trigger = 1.  # [Seconds]
+        self.post_trigger = 1.  # [Seconds]
+        self.trigger_save = True
+        self.trigger_freeze = True
 
         self._read_file()
 
@@ -63,13 +92,33 @@ class Settings:
         conf.add_section('collector')
         conf.add_section('gui')
         conf.add_section('auto_save')
+        conf.add_section('retention')
+        conf.add_section('trigger')
         conf.set('collector', 'tick_interval', '50')  # [milliseconds]
         conf.set('collector', 'sample_buf_len', '2')
+        conf.set('collector', 'use_thread', 'True')
+        conf.set('collector', 'catch_up', 'False')
+        conf.set('collector', 'read_timeout', '200')  # [milliseconds]
         conf.set('gui', 'default_x_axis_len', '30')  # [Seconds]
+        conf.set('gui', 'max_fps', '25')  # [Frames per second]
         conf.set('auto_save', 'use', 'False')
         conf.set('auto_save', 'append', 'False')
         conf.set('auto_save', 'interval', '5')  # [Minutes]
         conf.set('auto_save', 'folder', user_path)
+        conf.set('auto_save', 'csv_precision', '0')
+        conf.set('auto_save', 'flush_interval', '10')  # [Seconds]
+        conf.set('auto_save', 'max_file_size', '0')  # [MB]
+        conf.set('auto_save', 'format', 'csv')
+        conf.set('auto_save', 'compress', 'False')
+        conf.set('retention', 'max_age', '0')  # [Seconds]
+        conf.set('retention', 'max_samples', '0')
+        conf.set('retention', 'memory_budget', '0')  # [MB]
+        conf.set('retention', 'retain_unsaved', 'True')
+        conf.set('retention', 'on_disk', 'False')
+        conf.set('trigger', 'pre', '1.0')  # [Seconds]
+        conf.set('trigger', 'post', '1.0')  # [Seconds]
+        conf.set('trigger', 'save', 'True')
+        conf.set('trigger', 'freeze', 'True')
         with open(self.conf_file, 'w') as f:
             conf.write(f)
 
@@ -79,11 +128,33 @@ class Settings:
         conf.read(self.conf_file)
         conf.set('collector', 'tick_interval', str(self.sample_rate))
         conf.set('collector', 'sample_buf_len', str(self.dump_rate))
+        conf.set('collector', 'use_thread', str(self.use_thread))
+        conf.set('collector', 'catch_up', str(self.catch_up))
+        conf.set('collector', 'read_timeout', str(self.read_timeout))
         conf.set('gui', 'default_x_axis_len', str(self.default_x_axis_len))
+        conf.set('gui', 'max_fps', str(self.max_fps))
         conf.set('auto_save', 'use', str(self.use_auto_save))
         conf.set('auto_save', 'append', str(self.use_append))
         conf.set('auto_save', 'interval', str(self.as_interval))
         conf.set('auto_save', 'folder', str(self.as_folder))
+        conf.set('auto_save', 'csv_precision', str(self.csv_precision))
+        conf.set('auto_save', 'flush_interval', str(self.flush_interval))
+        conf.set('auto_save', 'max_file_size', str(self.max_file_size))
+        conf.set('auto_save', 'format', self.as_format)
+        conf.set('auto_save', 'compress', str(self.compress))
+        if not conf.has_section('retention'):
+            conf.add_section('retention')
+        conf.set('retention', 'max_age', str(self.max_age))
+        conf.set('retention', 'max_samples', str(self.max_samples))
+        conf.set('retention', 'memory_budget', str(self.memory_budget))
+        conf.set('retention', 'retain_unsaved', str(self.retain_unsaved))
+        conf.set('retention', 'on_disk', str(self.history_on_disk))
+        if not conf.has_section('trigger'):
+            conf.add_section('trigger')
+        conf.set('trigger', 'pre', str(self.pre_trigger))
+        conf.set('trigger', 'post', str(self.post_trigger))
+        conf.set('trigger', 'save', str(self.trigger_save))
+        conf.set('trigger', 'freeze', str(self.trigger_freeze))
         with open(self.conf_file, 'w') as f:
             conf.write(f)
 
@@ -92,8 +163,55 @@ class Settings:
         conf.read(self.conf_file)
         self.sample_rate = conf.getint('collector', 'tick_interval')
         self.dump_rate = conf.getint('collector', 'sample_buf_len')
+        self.use_thread = conf.getboolean('collector', 'use_thread',
+                                          fallback=True)
+        self.catch_up = conf.getboolean('collector', 'catch_up',
+                                        fallback=False)
+        self.read_timeout = conf.getint('collector', 'read_timeout',
+                                        fallback=200)
+        self.read_timeout = min(max(self.read_timeout,
+                                    self.read_timeout_min),
+                                self.read_timeout_max)
         self.default_x_axis_len = conf.getint('gui', 'default_x_axis_len')
+        self.max_fps = conf.getint('gui', 'max_fps', fallback=25)
+        self.max_fps = min(max(self.max_fps, self.max_fps_min),
+                           self.max_fps_max)
         self.use_auto_save = conf.getboolean('auto_save', 'use')
         self.use_append = conf.getboolean('auto_save', 'append')
         self.as_interval = conf.getint('auto_save', 'interval')
         self.as_folder = conf.get('auto_save', 'folder')
+        self.csv_precision = conf.getint('auto_save', 'csv_precision',
+                                         fallback=0)
+        self.flush_interval = conf.getint('auto_save', 'flush_interval',
+                                          fallback=10)
+        self.flush_interval = min(max(self.flush_interval,
+                                      self.flush_interval_min),
+                                  self.flush_interval_max)
+        self.max_file_size = conf.getint('auto_save', 'max_file_size',
+                                         fallback=0)
+        self.as_format = conf.get('auto_save', 'format', fallback='csv')
+        if self.as_format not in self.as_formats:
+            self.as_format = 'csv'
+        self.compress = conf.getboolean('auto_save', 'compress',
+                                        fallback=False)
+        self.max_age = conf.getint('retention', 'max_age', fallback=0)
+        self.max_samples = conf.getint('retention', 'max_samples',
+                                       fallback=0)
+        self.memory_budget = conf.getint('retention', 'memory_budget',
+                                         fallback=0)
+        self.retain_unsaved = conf.getboolean('retention', 'retain_unsaved',
+                                              fallback=True)
+        self.history_on_disk = conf.getboolean('retention', 'on_disk',
+                                               fallback=False)
+        self.pre_trigger = conf.getfloat('trigger', 'pre', fallback=1.)
+        self.pre_trigger = min(max(self.pre_trigger,
+                                   self.trigger_window_min),
+                               self.trigger_window_max)
+        self.post_trigger = conf.getfloat('trigger', 'post', fallback=1.)
+        self.post_trigger = min(max(self.post_trigger,
+                                    self.trigger_window_min),
+                                self.trigger_window_max)
+        self.trigger_save = conf.getboolean('trigger', 'save',
+                                            fallback=True)
+        self.trigger_freeze = conf.getboolean('trigger', 'freeze',
+                                              fallback=True)
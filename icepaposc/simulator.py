@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+from collections import namedtuple
+from functools import partial
+import argparse
+import math
+import random
+import threading
+import time
+
+# Back and forth motion of a simulated axis.
+#   distance     - Length of the move [steps].
+#   velocity     - Max velocity [steps/second].
+#   acceleration - Acceleration [steps/second^2].
+#   dwell        - Time stopped at each end [seconds].
+MotionProfile = namedtuple('MotionProfile', ['distance', 'velocity',
+                                             'acceleration', 'dwell'])
+
+
+class SimulatedAxis:
+    """A simulated IcePAP driver."""
+
+    # Status word bits.
+    READY = 1 << 9
+    MOVING = 1 << 10
+    SETTLING = 1 << 11
+    HOME = 1 << 20
+    POWERON = 1 << 23
+
+    def __init__(self, addr, profile, phase, noise, rng, settling_time=0.05,
+                 lag=0.002):
+        """
+        Initializes an instance of class SimulatedAxis.
+
+        addr          - Driver address.
+        profile       - MotionProfile followed by the axis.
+        phase         - Time offset in the motion cycle [seconds].
+        noise         - Standard deviation of the encoder noise [steps].
+        rng           - random.Random instance for the noise.
+        settling_time - Time settling after each move [seconds].
+        lag           - Following error as the time the encoders lag
+                        behind the axis [seconds].
+        """
+        self.addr = addr
+        self.profile = profile
+        self.phase = phase
+        self.noise = noise
+        self.rng = rng
+        self.settling_time = settling_time
+        self.lag = lag
+        p = profile
+        # Trapezoidal (or triangular if too short) velocity profile.
+        self.t_acc = min(p.velocity / p.acceleration,
+                         math.sqrt(p.distance / p.acceleration))
+        self.v_max = p.acceleration * self.t_acc
+        d_acc = p.acceleration * self.t_acc ** 2
+        self.t_move = 2 * self.t_acc + (p.distance - d_acc) / self.v_max
+        self.period = 2 * (self.t_move + p.dwell)
+        self.start = time.monotonic()
+
+    def get_cfg(self):
+        """
+        Retrieves the configuration parameters used by IcepapOSC.
+
+        Return: Dictionary.
+        """
+        return {'TGTENC': 'ENCIN', 'SHFTENC': 'NONE',
+                'ANSTEP': '1', 'ANTURN': '1',
+                'EINNSTEP': '1', 'EINNTURN': '1',
+                'ABSNSTEP': '1', 'ABSNTURN': '1',
+                'INPNSTEP': '1', 'INPNTURN': '1'}
+
+    def get_motion(self, t=None):
+        """
+        Computes the state of the motion.
+
+        t - Monotonic time. None for now.
+        Return: Tuple (position [steps], velocity [steps/second],
+                acceleration [steps/second^2], time since the end of the
+                last move [seconds] or None if moving).
+        """
+        if t is None:
+            t = time.monotonic()
+        p = self.profile
+        tc = (t - self.start + self.phase) % self.period
+        half = self.t_move + p.dwell
+        sign = 1
+        origin = 0.
+        if tc >= half:
+            tc -= half
+            sign = -1
+            origin = p.distance
+        if tc >= self.t_move:
+            return origin + sign * p.distance, 0., 0., tc - self.t_move
+        if tc < self.t_acc:
+            pos = 0.5 * p.acceleration * tc ** 2
+            vel = p.acceleration * tc
+            acc = p.acceleration
+        elif tc < self.t_move - self.t_acc:
+            pos = 0.5 * p.acceleration * self.t_acc ** 2 + \
+                  self.v_max * (tc - self.t_acc)
+            vel = self.v_max
+            acc = 0.
+        else:
+            tr = self.t_move - tc
+            pos = p.distance - 0.5 * p.acceleration * tr ** 2
+            vel = p.acceleration * tr
+            acc = -p.acceleration
+        return origin + sign * pos, sign * vel, sign * acc, None
+
+    def get_axis(self):
+        """Retrieves the axis (commanded) position [steps]."""
+        return int(round(self.get_motion()[0]))
+
+    def get_encoder(self):
+        """Retrieves the noisy encoder position [steps]."""
+        pos, vel, _, _ = self.get_motion()
+        pos -= vel * self.lag
+        return int(round(pos + self.rng.gauss(0., self.noise)))
+
+    def get_status(self):
+        """Retrieves the status word."""
+        pos, _, _, stopped = self.get_motion()
+        status = self.POWERON
+        if stopped is None:
+            status |= self.MOVING
+        elif stopped < self.settling_time:
+            status |= self.SETTLING
+        else:
+            status |= self.READY
+        if abs(pos) < 1:
+            status |= self.HOME
+        return status
+
+    def meas(self, register):
+        """
+        Measures an electrical magnitude.
+
+        register - 'I', 'IA', 'IB' or 'VM'.
+        Return: Measured value.
+        """
+        pos, vel, acc, _ = self.get_motion()
+        noise = self.rng.gauss(0., 0.01)
+        current = 0.5 + abs(acc) / self.profile.acceleration
+        if register == 'IA':
+            return current * math.cos(pos / 50.) + noise
+        if register == 'IB':
+            return current * math.sin(pos / 50.) + noise
+        if register == 'VM':
+            return 48. - 0.5 * current + noise
+        return current + noise
+
+
+class SimulatedController:
+    """
+    Simulated IcePAP system, usable by Collector instead of
+    IcePAPController.
+
+    Every axis moves back and forth following a motion profile. The
+    encoders follow with noise and a lag, and the status word goes
+    through moving, settling and ready. Every query can be delayed and
+    can fail like a real communication error (RuntimeError), for all the
+    drivers or for some of them only. Like on the single connection of
+    IcePAPController, the queries are serialized: a slow query delays
+    every other query of the system.
+    """
+
+    def __init__(self, host='simulator', port=5000, timeout=3,
+                 auto_axes=True, num_axes=8, profile=None, noise=2.,
+                 latency=0., latency_per_axis=0., failure_rate=0.,
+                 driver_latency=None, driver_failure_rate=None,
+                 cfg_latency=0., seed=0):
+        """
+        Initializes an instance of class SimulatedController.
+
+        host             - Not used. Same signature as IcePAPController.
+        port             - Not used.
+        timeout          - Not used.
+        auto_axes        - Not used.
+        num_axes         - Number of drivers. They get the addresses of a
+                           full system: 1-8, 11-18, 21-28...
+        profile          - MotionProfile of the axes. They are spread over
+                           the motion cycle.
+        noise            - Standard deviation of the encoder noise [steps].
+        latency          - Time taken by every query [seconds].
+        latency_per_axis - Additional time per axis in a query [seconds].
+        failure_rate     - Probability that a query fails.
+        driver_latency   - Dictionary {driver address: additional time
+                           taken by the queries of the driver [seconds]}.
+        driver_failure_rate - Dictionary {driver address: probability
+                              that a query of the driver fails}.
+        cfg_latency      - Additional time taken by a configuration query,
+                           which has a long answer [seconds].
+        seed             - Seed of the random numbers (noise and failures).
+        """
+        if profile is None:
+            profile = MotionProfile(10000, 5000, 20000, 0.5)
+        self.latency = latency
+        self.latency_per_axis = latency_per_axis
+        self.failure_rate = failure_rate
+        self.driver_latency = dict(driver_latency or {})
+        self.driver_failure_rate = dict(driver_failure_rate or {})
+        self.cfg_latency = cfg_latency
+        # Serializes the queries, like the lock of the communication of
+        # IcePAPController.
+        self._lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.axes = [(i // 8) * 10 + i % 8 + 1 for i in range(num_axes)]
+        self._axes = {}
+        for i, addr in enumerate(self.axes):
+            axis = SimulatedAxis(addr, profile, 0., noise, self.rng)
+            axis.phase = i * axis.period / num_axes
+            self._axes[addr] = axis
+
+    def __getitem__(self, addr):
+        return _AxisProxy(self, self._axes[addr])
+
+    def __len__(self):
+        return len(self.axes)
+
+    def get_pos(self, axes, register='AXIS'):
+        """
+        Reads a position register of several drivers.
+
+        axes     - List of driver addresses.
+        register - Position register.
+        Return: List of positions.
+        """
+        self._query(axes)
+        if register == 'AXIS':
+            return [self._axes[addr].get_axis() for addr in axes]
+        return [self._axes[addr].get_encoder() for addr in axes]
+
+    def get_fpos(self, axes, register='AXIS'):
+        """Same as get_pos() (fast position query)."""
+        return self.get_pos(axes, register)
+
+    def get_enc(self, axes, register='AXIS'):
+        """
+        Reads an encoder register of several drivers.
+
+        axes     - List of driver addresses.
+        register - Encoder register.
+        Return: List of encoder values.
+        """
+        self._query(axes)
+        return [self._axes[addr].get_encoder() for addr in axes]
+
+    def get_fstatus(self, axes):
+        """
+        Reads the status word of several drivers.
+
+        axes - List of driver addresses.
+        Return: List of status words.
+        """
+        self._query(axes)
+        return [self._axes[addr].get_status() for addr in axes]
+
+    def disconnect(self):
+        """Closes the (simulated) connection."""
+        pass
+
+    def _query(self, axes, delay=0.):
+        # A query waits for the answer of its slowest driver, and fails
+        # if any of its drivers fails.
+        delay += self.latency + self.latency_per_axis * len(axes)
+        delay += max([self.driver_latency.get(addr, 0.) for addr in axes]
+                     + [0.])
+        rates = [self.failure_rate] + \
+            [self.driver_failure_rate.get(addr, 0.) for addr in axes]
+        with self._lock:
+            if delay > 0:
+                time.sleep(delay)
+            for rate in rates:
+                if rate and self.rng.random() < rate:
+                    raise RuntimeError('Simulated communication failure.')
+
+
+class _AxisProxy:
+    """Single driver queries, with the latency and failures."""
+
+    def __init__(self, controller, axis):
+        self._controller = controller
+        self._axis = axis
+
+    def get_cfg(self):
+        self._controller._query([self._axis.addr],
+                                self._controller.cfg_latency)
+        return self._axis.get_cfg()
+
+    def meas(self, register):
+        self._controller._query([self._axis.addr])
+        return self._axis.meas(register)
+
+
+def add_simulator_arguments(parser):
+    """
+    Adds the command line options selecting the simulated IcePAP system.
+
+    parser - argparse.ArgumentParser instance.
+    """
+    parser.add_argument('--simulate', type=int, metavar='N', default=0,
+                        help='Use N simulated drivers instead of IcePAP')
+    parser.add_argument('--sim-latency', type=float, default=0.,
+                        metavar='MS',
+                        help='Time taken by every simulated query '
+                             '[milliseconds]')
+    parser.add_argument('--sim-failure-rate', type=float, default=0.,
+                        metavar='P',
+                        help='Probability that a simulated query fails')
+    parser.add_argument('--sim-slow-driver', type=_driver_value, default=[],
+                        action='append', metavar='ADDR:MS',
+                        help='Additional time taken by the simulated '
+                             'queries of a driver [milliseconds]. Can be '
+                             'repeated')
+    parser.add_argument('--sim-failing-driver', type=_driver_value,
+                        default=[], action='append', metavar='ADDR:P',
+                        help='Probability that a simulated query of a '
+                             'driver fails. Can be repeated')
+
+
+def _driver_value(text):
+    try:
+        addr, value = text.split(':')
+        return int(addr), float(value)
+    except ValueError:
+        msg = 'Bad driver value "{}". It should be: ' \
+              '<driver>:<value>'.format(text)
+        raise argparse.ArgumentTypeError(msg)
+
+
+def get_simulator(args):
+    """
+    Creates the backend selected by the command line options.
+
+    args - Parsed arguments (see add_simulator_arguments()).
+    Return: SimulatedController factory. None to connect to IcePAP.
+    """
+    if not args.simulate:
+        return None
+    return partial(SimulatedController, num_axes=args.simulate,
+                   latency=args.sim_latency / 1000.,
+                   failure_rate=args.sim_failure_rate,
+                   driver_latency={addr: ms / 1000. for addr, ms
+                                   in args.sim_slow_driver},
+                   driver_failure_rate=dict(args.sim_failing_driver))
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+from collections import deque
+import numpy as np
+from .export import get_capture_path, get_columns, get_metadata
+from .writer import FileWriter
+
+
+class Trigger:
+    """A condition on the value of a signal."""
+
+    MODES = ['rising', 'falling', 'above', 'below', 'change']
+
+    def __init__(self, driver_addr, sig_name, mode='rising', level=0.):
+        """
+        Initializes an instance of class Trigger.
+
+        driver_addr - IcePAP driver address.
+        sig_name    - Signal name.
+        mode        - 'rising'  - The value crosses the level upwards.
+                      'falling' - The value crosses the level downwards.
+                      'above'   - The value is above the level.
+                      'below'   - The value is below the level.
+                      'change'  - The value changes (level not used).
+        level       - Threshold.
+        """
+        if mode not in self.MODES:
+            msg = 'Bad trigger mode "{}".\nIt should be one of: ' \
+                  '{}'.format(mode, ', '.join(self.MODES))
+            raise Exception(msg)
+        self.driver_addr = driver_addr
+        self.signal_name = sig_name
+        self.mode = mode
+        self.level = level
+        self._last = None
+
+    def __str__(self):
+        text = '{}:{}:{}'.format(self.driver_addr, self.signal_name,
+                                 self.mode)
+        if self.mode != 'change':
+            text += ':{:g}'.format(self.level)
+        return text
+
+    def check(self, value):
+        """
+        Evaluates the condition on a new value of the signal.
+
+        value - Signal value. nan if missed.
+        Return: True if the trigger fires.
+        """
+        if value != value:
+            # Missed sample. The next one is compared with the last one
+            # acquired.
+            return False
+        last = self._last
+        self._last = value
+        if self.mode == 'above':
+            return value > self.level
+        if self.mode == 'below':
+            return value < self.level
+        if last is None:
+            return False
+        if self.mode == 'rising':
+            return last < self.level <= value
+        if self.mode == 'falling':
+            return last > self.level >= value
+        return value != last
+
+
+def parse_trigger(text):
+    """
+    Creates a trigger from its command line description.
+
+    text - <driver>:<signal name>:<mode>[:<level>]
+    Return: Trigger instance.
+    """
+    lst = text.split(':')
+    if len(lst) not in [3, 4]:
+        msg = 'Bad format of trigger "{}".\n' \
+              'It should be: ' \
+              '<driver>:<signal name>:<mode>[:<level>]'.format(text)
+        raise Exception(msg)
+    try:
+        level = float(lst[3]) if len(lst) == 4 else 0.
+        return Trigger(int(lst[0]), lst[1], lst[2], level)
+    except ValueError as e:
+        msg = 'Bad format of trigger "{}".\n{}'.format(text, e)
+        raise Exception(msg)
+
+
+class CaptureTrack:
+    """The samples of a signal in a capture."""
+
+    def __init__(self, subscription_id, channel, times, values):
+        """
+        Initializes an instance of class CaptureTrack.
+
+        subscription_id - Subscription id.
+        channel         - Channel of the signal.
+        times           - Array with the time of the samples.
+        values          - Array with the value of the samples.
+        """
+        self.subscription_id = subscription_id
+        self.driver_addr = channel.icepap_address
+        self.signal_name = channel.sig_name
+        # Set by the owner of the capture.
+        self.y_axis = 1
+        self.array_time = times
+        self.array_val = values
+
+
+class Capture:
+    """The samples of all the signals around a trigger event."""
+
+    def __init__(self, trigger, trigger_time, pre, post):
+        """
+        Initializes an instance of class Capture.
+
+        trigger      - The Trigger that fired.
+        trigger_time - Time of the sample that fired it.
+        pre          - Time captured before the event [seconds].
+        post         - Time captured after the event [seconds].
+        """
+        self.trigger = str(trigger)
+        self.time = trigger_time
+        self.start = trigger_time - pre
+        self.end = trigger_time + post
+        # Number of the capture in the acquisition.
+        self.number = 0
+        # List of CaptureTrack, when complete.
+        self.tracks = []
+
+
+class TriggerEngine:
+    """
+    Evaluates triggers on the acquired samples and captures a time window
+    around each event.
+
+    The samples of the last pre-trigger seconds are kept in a ring
+    buffer per signal. When a trigger fires, the samples of the following
+    post-trigger seconds are added, and the capture is handed to a
+    callback once every signal has been fed past its end. Triggers firing
+    while a capture is in progress are ignored.
+    """
+
+    def __init__(self, triggers, pre, post, on_capture):
+        """
+        Initializes an instance of class TriggerEngine.
+
+        triggers   - List of Trigger.
+        pre        - Time captured before each event [seconds].
+        post       - Time captured after each event [seconds].
+        on_capture - Function called with each complete Capture.
+        """
+        self.triggers = {}
+        for trigger in triggers:
+            key = (trigger.driver_addr, trigger.signal_name)
+            self.triggers.setdefault(key, []).append(trigger)
+        self.pre = pre
+        self.post = post
+        self.on_capture = on_capture
+        self.capture = None
+        self.count = 0
+        # {subscription_id: (channel, deque of (time, value))}
+        self._rings = {}
+
+    def feed(self, subscription_id, channel, time_val, value):
+        """
+        Processes a new sample.
+
+        subscription_id - Subscription id.
+        channel         - Channel of the signal.
+        time_val        - Time of the sample.
+        value           - Value of the sample.
+        """
+        ring = self._rings.get(subscription_id)
+        if ring is None:
+            ring = deque()
+            self._rings[subscription_id] = (channel, ring)
+        else:
+            ring = ring[1]
+        ring.append((time_val, value))
+        if self.capture is not None and time_val > self.capture.end:
+            # The signals are fed one after the other, dump by dump: wait
+            # until all of them have their samples up to the end.
+            end = self.capture.end
+            if all(r[-1][0] > end for _, r in self._rings.values()):
+                self.complete()
+        # The triggers see all the samples, also during a capture, so
+        # that their edges are detected against the previous value.
+        key = (channel.icepap_address, channel.sig_name)
+        for trigger in self.triggers.get(key, []):
+            if trigger.check(value) and self.capture is None:
+                self.capture = Capture(trigger, time_val, self.pre,
+                                       self.post)
+        if self.capture is None:
+            limit = self._get_pre_limit()
+            while ring[0][0] < limit:
+                ring.popleft()
+
+    def complete(self):
+        """
+        Completes the capture in progress, if any, with the samples
+        acquired so far.
+        """
+        capture = self.capture
+        if capture is None:
+            return
+        self.capture = None
+        for subscription_id, (channel, ring) in self._rings.items():
+            samples = [tv for tv in ring
+                       if capture.start <= tv[0] <= capture.end]
+            if not samples:
+                continue
+            data = np.array(samples, dtype=np.float64)
+            capture.tracks.append(CaptureTrack(subscription_id, channel,
+                                               data[:, 0], data[:, 1]))
+        # Keep what is still needed for the next pre-trigger window.
+        limit = self._get_pre_limit()
+        for _, ring in self._rings.values():
+            while ring[0][0] < limit:
+                ring.popleft()
+        self.count += 1
+        capture.number = self.count
+        self.on_capture(capture)
+
+    def _get_pre_limit(self):
+        # A trigger can still fire on a signal not fed up to the newest
+        # samples of the others yet.
+        return min(r[-1][0] for _, r in self._rings.values()) - self.pre
+
+    def discard(self, subscription_id):
+        """
+        Forgets the samples of a signal no longer acquired.
+
+        subscription_id - Subscription id.
+        """
+        self._rings.pop(subscription_id, None)
+
+
+def get_capture_job(capture, collector, settings):
+    """
+    Prepares the writing of a capture to its own file.
+
+    capture   - A complete Capture.
+    collector - The Collector acquiring the signals.
+    settings  - An instance of class Settings. The auto save settings
+                select the folder and format.
+    Return: FileWriter.Job.
+    """
+    path = get_capture_path(settings.as_folder, settings.as_format,
+                            '_trigger{}'.format(capture.number))
+    metadata = get_metadata(collector, capture.tracks, settings)
+    metadata['trigger'] = {'condition': capture.trigger,
+                           'time': capture.time,
+                           'start': capture.start,
+                           'end': capture.end}
+    precision = settings.csv_precision or None
+    return FileWriter.Job(path, get_columns(capture.tracks), 0, precision,
+                          metadata, settings.compress)
+
+
+def add_trigger_arguments(parser):
+    """
+    Adds the command line options defining triggers.
+
+    parser - argparse.ArgumentParser instance.
+    """
+    parser.add_argument('--trigger', action='append', default=[],
+                        metavar='TRIGGER',
+                        help='Capture a time window around each event '
+                             '<driver>:<signal name>:<mode>[:<level>]. '
+                             'Modes: {}'.format(', '.join(Trigger.MODES)))
+
+
+def get_triggers(args):
+    """
+    Creates the triggers selected by the command line options.
+
+    args - Parsed arguments (see add_trigger_arguments()).
+    Return: List of Trigger.
+    """
+    return [parse_trigger(text) for text in args.trigger]
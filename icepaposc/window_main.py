@@ -17,24 +17,49 @@
 # along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
 # -----------------------------------------------------------------------------
 import pyqtgraph as pg
-import numpy as np
-import collections
 import time
 import datetime
+import shutil
+import tempfile
+from functools import partial
 
 from PyQt5 import QtWidgets, Qt, QtCore, uic
 from pkg_resources import resource_filename
 from .collector import Collector
+from .replay import Replay
 from .dialog_settings import DialogSettings
 from .settings import Settings
 from .axis_time import AxisTime
 from .curve_item import CurveItem
+from .sample_buffer import SampleBuffer, MappedSampleBuffer
+from .export import get_capture_path, get_columns, get_metadata, \
+    write_csv, write_npz
+from .trigger import TriggerEngine, get_capture_job
+from .writer import FileWriter
+
+
+class _WriterSignals(QtCore.QObject):
+    """Forwards the FileWriter notifications to the GUI thread."""
+
+    error = QtCore.pyqtSignal(str)
+    backpressure = QtCore.pyqtSignal(int)
+
+
+class _CollectorSignals(QtCore.QObject):
+    """Forwards the Collector notifications to the GUI thread."""
+
+    driver_cfgs = QtCore.pyqtSignal()
 
 
 class WindowMain(QtWidgets.QMainWindow):
     """A dialog for plotting IcePAP signals."""
 
-    def __init__(self, host, port, timeout, siglist, selected_driver=None):
+    # Fraction of the memory budget filled when old samples are dropped to
+    # fit in it.
+    BUDGET_FILL = 0.9
+
+    def __init__(self, host, port, timeout, siglist, selected_driver=None,
+                 capture=None, backend=None, triggers=None):
         """
         Initializes an instance of class WindowMain.
 
@@ -45,6 +70,14 @@ class WindowMain(QtWidgets.QMainWindow):
                             Element Syntax: <driver>:<signal name>:<Y-axis>
                             Example: ["1:PosAxis:1", "1:MeasI:2", "1:MeasVm:3"]
         selected_driver - The driver to display in combobox at startup.
+        capture         - If not None, path of a saved capture (CSV or NPZ)
+                          to display instead of connecting to IcePAP.
+                          All its signals are displayed if siglist is
+                          empty.
+        backend         - Connection to the IcePAP system (see Collector).
+        triggers        - List of Trigger. A time window around each
+                          event is saved and/or displayed (see the
+                          trigger settings).
         """
         QtWidgets.QMainWindow.__init__(self, None)
         ui_filename = resource_filename('icepaposc.ui', 'window_main.ui')
@@ -52,15 +85,26 @@ class WindowMain(QtWidgets.QMainWindow):
         uic.loadUi(ui_filename, baseinstance=self.ui)
 
         self.setAttribute(QtCore.Qt.WA_DeleteOnClose, True)
-        self.setWindowTitle('Oscilloscope  |  ' + host)
         self.settings = Settings()
+        self._replay = capture is not None
+        self._collector_signals = _CollectorSignals()
 
         try:
-            self.collector = Collector(host,
-                                       port,
-                                       timeout,
-                                       self.settings,
-                                       self.callback_collect)
+            if self._replay:
+                self.setWindowTitle('Oscilloscope  |  Replay  |  ' + capture)
+                self.collector = Replay(capture,
+                                        self.settings,
+                                        self.callback_collect)
+            else:
+                self.setWindowTitle('Oscilloscope  |  ' + host)
+                self.collector = Collector(host,
+                                           port,
+                                           timeout,
+                                           self.settings,
+                                           self.callback_collect,
+                                           backend=backend)
+                self.collector.warm_up_driver_cfgs(
+                    self._collector_signals.driver_cfgs.emit)
         except Exception as e:
             msg = 'Failed to create main window.\n{}'.format(e)
             print(msg)
@@ -70,6 +114,12 @@ class WindowMain(QtWidgets.QMainWindow):
         self.subscriptions = {}
         self.curve_items = []
         self._paused = False
+        self._new_data = False
+        self._view_changed = False
+        self._history_folder = None
+        self.trigger_engine = None
+        self._capture_writer = None
+        self._last_capture = None
 
         # Set up the plot area.
         self.plot_widget = pg.PlotWidget()
@@ -90,6 +140,10 @@ class WindowMain(QtWidgets.QMainWindow):
         self.view_boxes[0].disableAutoRange(axis=self.view_boxes[0].XAxis)
         self.view_boxes[1].disableAutoRange(axis=self.view_boxes[1].XAxis)
         self.view_boxes[2].disableAutoRange(axis=self.view_boxes[2].XAxis)
+        # Curves are drawn in chunks reaching outside the X range. Only
+        # the visible part must be used for the Y auto range.
+        for view_box in self.view_boxes:
+            view_box.setAutoVisible(y=True)
         self._reset_x()
 
         # Set up the three Y-axes.
@@ -122,7 +176,42 @@ class WindowMain(QtWidgets.QMainWindow):
                                     rateLimit=60,
                                     slot=self._mouse_moved)
 
+        # Repaint the curves at a limited frame rate, not on data arrival.
+        self._render_ticker = QtCore.QTimer()
+        self._render_ticker.timeout.connect(self._render_frame)
+        self._render_ticker.start(self._get_frame_period())
+
+        # Display the acquisition timing in the status bar.
+        self._stats_ticker = QtCore.QTimer()
+        self._stats_ticker.timeout.connect(self._update_statistics)
+        self._stats_ticker.start(1000)
+
+        # Set up the eviction of old samples. A replayed capture is kept.
+        self._retention_ticker = QtCore.QTimer()
+        self._retention_ticker.timeout.connect(self._apply_retention)
+        if not self._replay:
+            self._retention_ticker.start(1000)
+
+        # Set up auto save of collected signal data.
+        self._save_ticker = QtCore.QTimer()
+        self._save_ticker.timeout.connect(self._auto_save)
+        self._idx = 0
+        self._settings_updated = False
+        self._file_path = None
+        self._file_time = None
+        self._prepare_next_auto_save()
+        self._writer_signals = _WriterSignals()
+        self._writer_signals.error.connect(self._writer_error)
+        self._writer_signals.backpressure.connect(self._writer_backpressure)
+        self._writer = FileWriter(self._writer_signals.error.emit,
+                                  self._writer_signals.backpressure.emit,
+                                  max_size=self._get_max_file_size())
+        self._writer.start()
+
         # Add any predefined signals.
+        if self._replay and not siglist:
+            siglist = ['{}:{}:{}'.format(*curve)
+                       for curve in self.collector.get_curves()]
         for sig in siglist:
             lst = sig.split(':')
             if len(lst) != 3:
@@ -135,15 +224,9 @@ class WindowMain(QtWidgets.QMainWindow):
             auto_save = True if sig == siglist[-1] else False
             self._add_signal(int(lst[0]), lst[1], int(lst[2]), auto_save)
 
-        # Set up auto save of collected signal data.
-        self._save_ticker = QtCore.QTimer()
-        self._save_ticker.timeout.connect(self._auto_save)
-        self._save_time = None
-        self._idx = 0
-        self._settings_updated = False
-        self._file_path = None
-        self._old_use_append = self.settings.use_append
-        self._prepare_next_auto_save()
+        # Set up the triggers on the displayed signals.
+        if triggers and not self._replay:
+            self._set_triggers(triggers)
 
     def _fill_combo_box_driver_ids(self, selected_driver):
         driver_ids = self.collector.get_available_drivers()
@@ -162,14 +245,31 @@ class WindowMain(QtWidgets.QMainWindow):
                   'more colors and pens.'
             print(msg)
             QtWidgets.QMessageBox.warning(self, 'Available Signals', msg)
-            for i in range(num_colors):
-                self.ui.cbSignals.addItem(signals[i])
-        else:
-            for sig in signals:
-                self.ui.cbSignals.addItem(sig)
-        self.ui.cbSignals.setCurrentIndex(0)
+            signals = signals[:num_colors]
+        self._signals = signals
+        self._fill_combo_box_driver_signals()
+
+    def _fill_combo_box_driver_signals(self):
+        """Lists the signals available in the selected driver."""
+        current = self.ui.cbSignals.currentText()
+        driver = self.ui.cbDrivers.currentText()
+        signals = self._signals
+        if driver:
+            available = self.collector.get_available_signals(int(driver))
+            signals = [sig for sig in signals if sig in available]
+        self.ui.cbSignals.clear()
+        for sig in signals:
+            self.ui.cbSignals.addItem(sig)
+        self.ui.cbSignals.setCurrentIndex(
+            max(self.ui.cbSignals.findText(current), 0))
 
     def _connect_signals(self):
+        self.ui.cbDrivers.currentIndexChanged.connect(
+            self._fill_combo_box_driver_signals)
+        # The signals not mapped in a driver are known once its
+        # configuration has been retrieved.
+        self._collector_signals.driver_cfgs.connect(
+            self._fill_combo_box_driver_signals)
         self.ui.rbAxis1.clicked.connect(self._select_axis_1)
         self.ui.rbAxis2.clicked.connect(self._select_axis_2)
         self.ui.rbAxis3.clicked.connect(self._select_axis_3)
@@ -194,12 +294,104 @@ class WindowMain(QtWidgets.QMainWindow):
         self.ui.actionCurrents.triggered.connect(self._signals_currents)
         self.ui.actionTarget.triggered.connect(self._signals_target)
         self.view_boxes[0].sigResized.connect(self._update_views)
+        self.view_boxes[0].sigXRangeChanged.connect(self._x_range_changed)
 
     def closeEvent(self, event):
         """Overloads (QMainWindow) QWidget.closeEvent()."""
+        if self.trigger_engine:
+            # Save the capture in progress, shorter.
+            self.trigger_engine.complete()
         self._remove_all_signals()
+        self.collector.close()
+        self._writer.stop()
+        if self._capture_writer:
+            self._capture_writer.stop()
+        if self._history_folder:
+            shutil.rmtree(self._history_folder, ignore_errors=True)
         event.accept()
 
+    def _set_triggers(self, triggers):
+        """
+        Starts evaluating triggers on the collected samples.
+
+        triggers - List of Trigger.
+        """
+        for trigger in triggers:
+            if not self._get_curve_item(trigger.driver_addr,
+                                        trigger.signal_name):
+                msg = 'The signal of trigger {} is not displayed.\n' \
+                      'Ignoring the trigger.'.format(trigger)
+                print(msg)
+                QtWidgets.QMessageBox.critical(self, 'Trigger', msg)
+        triggers = [t for t in triggers
+                    if self._get_curve_item(t.driver_addr, t.signal_name)]
+        if not triggers:
+            return
+        # Captures go to their own files, not to the auto save one.
+        signals = self._writer_signals
+        self._capture_writer = FileWriter(signals.error.emit,
+                                          signals.backpressure.emit)
+        self._capture_writer.start()
+        self.trigger_engine = TriggerEngine(triggers,
+                                            self.settings.pre_trigger,
+                                            self.settings.post_trigger,
+                                            self._trigger_captured)
+        self.collector.set_trigger_engine(self.trigger_engine)
+
+    def _get_curve_item(self, driver_addr, signal_name):
+        for ci in self.curve_items:
+            if ci.driver_addr == driver_addr and \
+                    ci.signal_name == signal_name:
+                return ci
+        return None
+
+    def _trigger_captured(self, capture):
+        """
+        Saves and/or displays the samples around a trigger event.
+
+        capture - A complete Capture.
+        """
+        for ct in capture.tracks:
+            ci = self._get_curve_item(ct.driver_addr, ct.signal_name)
+            if ci:
+                ct.y_axis = ci.y_axis
+        self._last_capture = capture
+        if self.settings.trigger_save:
+            job = get_capture_job(capture, self.collector, self.settings)
+            if self._capture_writer.submit(job):
+                self._capture_writer.close_file(block=False)
+            else:
+                print('Capture {} not saved. Too many writes '
+                      'pending.'.format(capture.number))
+        if self.settings.trigger_freeze and not self._paused:
+            self._pause_x_axis()
+            self.view_boxes[0].setXRange(capture.start, capture.end,
+                                         padding=0)
+            max_points = self._get_max_points()
+            for ci in self.curve_items:
+                ci.update_curve(capture.start, capture.end, max_points)
+
+    def _get_new_buffer(self):
+        """
+        Selects where the samples of a new curve are stored.
+
+        Return: Function creating a SampleBuffer from its initial capacity.
+        """
+        if not self.settings.history_on_disk:
+            return SampleBuffer
+        if not self._history_folder:
+            try:
+                self._history_folder = tempfile.mkdtemp(
+                    prefix='IcepapOSC_history_', dir=self.settings.as_folder)
+            except Exception as e:
+                msg = 'Failed to create history folder in: {}\n{}\n' \
+                      'Samples are kept in memory.'.format(
+                          self.settings.as_folder, e)
+                print(msg)
+                QtWidgets.QMessageBox.critical(self, 'History Folder', msg)
+                return SampleBuffer
+        return partial(MappedSampleBuffer, self._history_folder)
+
     def _update_views(self):
         """Updates the geometry of the view boxes."""
         self.view_boxes[1].setGeometry(self.view_boxes[0].sceneBoundingRect())
@@ -275,7 +467,7 @@ class WindowMain(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.critical(self, 'Add Curve', msg)
             return
         ci = CurveItem(subscription_id, driver_addr, signal_name,
-                       y_axis, color_idx)
+                       y_axis, color_idx, self._get_new_buffer())
         self._add_curve(ci)
         self.curve_items.append(ci)
         self.collector.start(subscription_id)
@@ -295,6 +487,7 @@ class WindowMain(QtWidgets.QMainWindow):
         ci = self.curve_items[index]
         self.collector.unsubscribe(ci.subscription_id)
         self._remove_curve_plot(ci)
+        ci.close()
         self.ui.lvActiveSig.takeItem(index)
         self.curve_items.remove(ci)
         self._update_plot_axes_labels()
@@ -306,6 +499,7 @@ class WindowMain(QtWidgets.QMainWindow):
         for ci in self.curve_items:
             self.collector.unsubscribe(ci.subscription_id)
             self._remove_curve_plot(ci)
+            ci.close()
         self.ui.lvActiveSig.clear()
         self.curve_items = []
         self._update_plot_axes_labels()
@@ -332,8 +526,9 @@ class WindowMain(QtWidgets.QMainWindow):
 
         ci - Curve item that will be the owner.
         """
-        my_curve = ci.create_curve()
-        self.view_boxes[ci.y_axis - 1].addItem(my_curve)
+        ci.attach(self.view_boxes[ci.y_axis - 1])
+        x_min, x_max = self.view_boxes[0].viewRange()[0]
+        ci.update_curve(x_min, x_max, self._get_max_points())
 
     def _mouse_moved(self, evt):
         """
@@ -373,7 +568,7 @@ class WindowMain(QtWidgets.QMainWindow):
 
         ci - Curve item to remove.
         """
-        self.view_boxes[ci.y_axis - 1].removeItem(ci.curve)
+        ci.detach()
 
     def _signals_closed_loop(self):
         """Display a specific set of curves."""
@@ -473,120 +668,121 @@ class WindowMain(QtWidgets.QMainWindow):
     def _save_to_file(self):
         if not self.curve_items:
             return
-        capt = "Save to csv file"
-        fn = QtWidgets.QFileDialog.getSaveFileName(caption=capt,
-                                                   filter="*.csv")
+        capt = "Save to file"
+        filters = "CSV files (*.csv);;NPZ files (*.npz)"
+        selected = "NPZ files (*.npz)" if self.settings.as_format == "npz" \
+            else "CSV files (*.csv)"
+        fn, selected = QtWidgets.QFileDialog.getSaveFileName(
+            caption=capt, filter=filters, initialFilter=selected)
         if not fn:
             return
-        if fn[-4:] != ".csv":
-            fn = fn + ".csv"
+        ext = ".npz" if selected.startswith("NPZ") else ".csv"
+        if fn[-4:].lower() not in [".csv", ".npz"]:
+            fn = fn + ext
+        is_npz = fn[-4:].lower() == ".npz"
         try:
-            f = open(fn, "w+")
+            f = open(fn, "w+b" if is_npz else "w+")
         except Exception as e:
             msg = 'Failed to open/create file: {}\n{}'.format(fn, e)
             print(msg)
             QtWidgets.QMessageBox.critical(self, 'File Open Failed', msg)
             return
-        self._create_csv_file(f)
+        if is_npz:
+            self._create_npz_file(f)
+        else:
+            self._create_csv_file(f)
         f.close()
 
     def _create_csv_file(self, csv_file):
-        my_dict = collections.OrderedDict()
-        for ci in self.curve_items:
-            header = "time-{}-{}".format(ci.driver_addr, ci.signal_name)
-            my_dict[header] = ci.array_time
-            header = "val-{}-{}".format(ci.driver_addr, ci.signal_name)
-            my_dict[header] = ci.array_val
-        key_longest = list(my_dict.keys())[0]
-        for key in my_dict:
-            if my_dict[key][0] < my_dict[key_longest][0]:
-                key_longest = key
-        for key in my_dict:
-            delta = len(my_dict[key_longest]) - len(my_dict[key])
-            my_dict[key] = delta * [np.nan] + my_dict[key]
-        for key in my_dict:
-            csv_file.write(",{}".format(key))
-        csv_file.write("\n")
-        for idx in range(0, len(my_dict[key_longest])):
-            line = str(idx)
-            for key in my_dict:
-                line += ",{}".format(my_dict[key][idx])
-            csv_file.write(line + '\n')
+        columns = get_columns(self.curve_items)
+        write_csv(csv_file, columns, precision=self._get_precision())
+
+    def _create_npz_file(self, npz_file):
+        columns = get_columns(self.curve_items)
+        write_npz(npz_file, columns, metadata=self._get_metadata(),
+                  compress=self.settings.compress)
+
+    def _get_metadata(self):
+        return get_metadata(self.collector, self.curve_items, self.settings)
+
+    def _get_precision(self):
+        precision = self.settings.csv_precision
+        return precision if precision > 0 else None
 
     def _auto_save(self, use_new_file=False):
+        """
+        Writes the samples collected since the previous call.
+
+        use_new_file - If True, the next samples go to a new file.
+        """
         if not self.curve_items or not self._file_path:
             return
         if not self._settings_updated and not self.settings.use_auto_save:
             return
         self._save_ticker.stop()
-
-        # Create matrix.
-        my_dict = collections.OrderedDict()
-        for ci in self.curve_items:
-            start_idx = ci.get_time_index(self._save_time)
-            header = "time-{}-{}".format(ci.driver_addr, ci.signal_name)
-            my_dict[header] = ci.array_time[start_idx:]
-            header = "val-{}-{}".format(ci.driver_addr, ci.signal_name)
-            my_dict[header] = ci.array_val[start_idx:]
-        key_longest = None
-        for key in my_dict:  # Find a non empty list.
-            if my_dict[key]:
-                key_longest = key
-                break
-        if not key_longest:
-            self._prepare_next_auto_save(True)
-            return
-        for key in my_dict:  # Find the longest list.
-            if my_dict[key] and my_dict[key][0] < my_dict[key_longest][0]:
-                key_longest = key
-        for key in my_dict:  # Fill up the shorter lists with nan.
-            delta = len(my_dict[key_longest]) - len(my_dict[key])
-            my_dict[key] = delta * [np.nan] + my_dict[key]
-
-        # Write matrix to file.
-        try:
-            f = open(self._file_path, self._get_write_mode())
-        except Exception as e:
-            msg = 'Failed to open file: {}\n{}'.format(self._file_path, e)
-            print(msg)
-            QtWidgets.QMessageBox.critical(self, 'File Open Failed', msg)
-            return
-        if self._idx == 0:
-            for key in my_dict:
-                f.write(",{}".format(key))
-            f.write("\n")
-        for i in range(0, len(my_dict[key_longest])):
-            line = str(self._idx)
-            self._idx += 1
-            for key in my_dict:
-                line += ",{}".format(my_dict[key][i])
-            f.write(line + '\n')
-        f.close()
+        file_age = time.time() - self._file_time
+        if not self.settings.use_append and \
+                file_age >= 60 * self.settings.as_interval:
+            use_new_file = True
+
+        # Hand the new samples over to the writer thread. The columns are
+        # views of the curve buffers, which never modify stored samples in
+        # place.
+        marks = [ci.save_mark for ci in self.curve_items]
+        columns = get_columns(self.curve_items, marks)
+        rows = max(len(col) for _, col in columns)
+        if rows:
+            job = FileWriter.Job(self._file_path, columns, self._idx,
+                                 self._get_precision(),
+                                 self._get_metadata(),
+                                 self.settings.compress)
+            # Never wait for the writer in the GUI thread.
+            if self._writer.submit(job):
+                self._idx += rows
+                for i, ci in enumerate(self.curve_items):
+                    start = max(marks[i], ci.buffer.first_index)
+                    ci.save_mark = start + len(columns[2 * i][1])
+            elif not use_new_file:
+                # Writer busy. Save these samples at the next flush.
+                self._save_ticker.start(1000 * self.settings.flush_interval)
+                return
+            # Else they are saved at the next flush, to the new file.
+        if use_new_file:
+            # If the queue is full, the writer closes the file when the
+            # samples for the new one arrive.
+            self._writer.close_file(block=False)
 
         self._prepare_next_auto_save(use_new_file)
 
+    def _writer_error(self, msg):
+        QtWidgets.QMessageBox.critical(self, 'Auto Save Failed', msg)
+
+    def _writer_backpressure(self, pending):
+        msg = 'Auto save is falling behind. {} writes ' \
+              'pending.'.format(pending)
+        print(msg)
+
     def _prepare_next_auto_save(self, use_new_file=False):
-        if self.settings.use_auto_save:
-            if use_new_file or not self.settings.use_append or \
-                    not self._file_path or self._settings_updated:
+        if self.settings.use_auto_save and not self._replay:
+            if not self._file_path:
+                # Only save the samples collected from now on.
+                for ci in self.curve_items:
+                    ci.save_mark = ci.buffer.end_index
+            if use_new_file or not self._file_path or \
+                    self._settings_updated:
                 self._set_new_file_path()
-            self._save_time = time.time()
-            self._save_ticker.start(60000 * self.settings.as_interval)
+            self._save_ticker.start(1000 * self.settings.flush_interval)
         else:
-            self._save_time = None
             self._file_path = None
 
     def _set_new_file_path(self):
         self._idx = 0
-        time_str = time.strftime("%Y%m%d_%H%M%S", time.localtime())
-        file_name = "IcepapOSC_{}.csv".format(time_str)
-        self._file_path = self.settings.as_folder + '/' + file_name
+        self._file_time = time.time()
+        self._file_path = get_capture_path(self.settings.as_folder,
+                                           self.settings.as_format)
 
-    def _get_write_mode(self):
-        do_append = self.settings.use_append
-        if self._settings_updated:
-            do_append = self._old_use_append
-        return "a+" if do_append else "w+"
+    def _get_max_file_size(self):
+        return self.settings.max_file_size * 1024 * 1024
 
     def _display_settings_dlg(self):
         self.enable_action(False)
@@ -600,8 +796,9 @@ class WindowMain(QtWidgets.QMainWindow):
             self._auto_save(True)
         else:
             self._prepare_next_auto_save()
-        self._old_use_append = self.settings.use_append
         self._settings_updated = False
+        self._writer.max_size = self._get_max_file_size()
+        self._render_ticker.start(self._get_frame_period())
         self._reset_x()
 
     def callback_collect(self, subscription_id, value_list):
@@ -614,22 +811,154 @@ class WindowMain(QtWidgets.QMainWindow):
         for ci in self.curve_items:
             if ci.subscription_id == subscription_id:
                 ci.collect(value_list)
-        if not self._paused:
+        self._new_data = True
+
+    def _get_frame_period(self):
+        return int(1000 / self.settings.max_fps)
+
+    def _x_range_changed(self):
+        self._view_changed = True
+
+    def _render_frame(self):
+        """
+        Repaints the plot if new data arrived, or the X-axis was zoomed
+        or panned, since the last frame.
+        """
+        if self._new_data and not self._paused:
+            self._new_data = False
             self._update_view()
+        elif self._view_changed:
+            self._update_curves()
+
+    def _update_statistics(self):
+        stats = self.collector.get_statistics()
+        msg = 'Sample rate: {:.1f} Hz  |  Jitter p50/p99: {:.1f}/{:.1f} ms' \
+              '  |  Overruns: {} ({} skipped)'
+        msg = msg.format(stats['rate'], stats['jitter_p50'],
+                         stats['jitter_p99'], stats['overruns'],
+                         stats['skipped'])
+        driver_time = stats['driver_time']
+        if driver_time:
+            addr = max(driver_time, key=driver_time.get)
+            msg += '  |  Slowest driver: {} ({:.1f} ms)'.format(
+                addr, driver_time[addr])
+        reads = stats['cache_hits'] + stats['cache_misses']
+        if reads:
+            msg += '  |  Cached reads: {:.0f}%'.format(
+                100. * stats['cache_hits'] / reads)
+        if stats['dropped']:
+            msg += '  |  Dropped: {}'.format(stats['dropped'])
+        missed = sum(stats['missed'].values())
+        if missed:
+            msg += '  |  Missed: {}'.format(missed)
+        if stats['backed_off']:
+            msg += '  |  Backing off drivers: {}'.format(
+                ', '.join(str(addr) for addr in stats['backed_off']))
+        if self._writer.pending():
+            msg += '  |  Pending writes: {}'.format(self._writer.pending())
+        if self._last_capture:
+            msg += '  |  Triggers: {} (last {} at {})'.format(
+                self.trigger_engine.count, self._last_capture.trigger,
+                time.strftime('%H:%M:%S',
+                              time.localtime(self._last_capture.time)))
+        memory = sum(ci.memory_usage() for ci in self.curve_items)
+        msg += '  |  Memory: {:.1f} MB'.format(memory / 1024. / 1024.)
+        self.ui.statusbar.showMessage(msg)
+
+    def _apply_retention(self):
+        """Drops the samples not covered by the retention settings."""
+        time_limit = None
+        if self.settings.retain_unsaved and self._file_path:
+            # Keep what has not been written by the auto save yet.
+            time_limit = self._get_unsaved_time()
+        for ci in self.curve_items:
+            ci.apply_retention(self.settings.max_age,
+                               self.settings.max_samples, time_limit)
+        if self.settings.memory_budget:
+            self._apply_memory_budget(
+                self.settings.memory_budget * 1024 * 1024, time_limit)
+        for index, ci in enumerate(self.curve_items):
+            tip = '{} samples, {:.1f} MB'.format(len(ci.buffer),
+                                                 ci.memory_usage() / 1048576.)
+            self.ui.lvActiveSig.item(index).setToolTip(tip)
+
+    def _get_unsaved_time(self):
+        """
+        Retrieves the time of the oldest sample not auto saved yet.
+
+        Return: Time [seconds]. None if all samples are saved.
+        """
+        times = []
+        for ci in self.curve_items:
+            idx = ci.save_mark - ci.buffer.first_index
+            if idx < len(ci.buffer):
+                times.append(ci.array_time[max(idx, 0)])
+        return min(times) if times else None
+
+    def _apply_memory_budget(self, budget, time_limit=None):
+        """
+        Drops the oldest samples of all curves until they fit in a budget.
+
+        budget     - Max memory allocated by all curves [bytes].
+        time_limit - If not None, samples collected at or after this time
+                     are kept regardless of the budget.
+        """
+        # Curves stored on disk do not use the budget.
+        curve_items = [ci for ci in self.curve_items if ci.memory_usage()]
+        if sum(ci.memory_usage() for ci in curve_items) <= budget:
+            return
+        # The memory of the samples dropped before is only released when
+        # the buffers are compacted.
+        for ci in curve_items:
+            ci.compact()
+        if sum(ci.memory_usage() for ci in curve_items) <= budget:
+            return
+        # Memory allocated per sample, including the room to grow.
+        sample_size = [ci.memory_usage() / max(len(ci.buffer), 1)
+                       for ci in curve_items]
+        # Leave room for the samples to come before the next check, so
+        # that the buffers are not compacted every time.
+        budget *= self.BUDGET_FILL
+        # Bisect the oldest time to keep.
+        t_min = min(ci.start_time() for ci in curve_items
+                    if len(ci.buffer))
+        t_max = self.collector.get_current_time()
+        for _ in range(50):
+            t = (t_min + t_max) / 2.
+            kept = sum(size * ci.samples_since(t)
+                       for size, ci in zip(sample_size, curve_items))
+            if kept > budget:
+                t_min = t
+            else:
+                t_max = t
+        if time_limit is not None:
+            t_max = min(t_max, time_limit)
+        for ci in curve_items:
+            ci.drop_before(t_max)
+            ci.compact()
 
     def _update_view(self):
         x_min = self.view_boxes[0].viewRange()[0][0]
         x_max = self.view_boxes[0].viewRange()[0][1]
 
         # Update the X-axis.
-        now_in_range = self.now <= x_max
+        now_in_range = bool(self.now <= x_max)
         self.now = self.collector.get_current_time()
         if now_in_range:
             self.view_boxes[0].setXRange(self.now - (x_max - x_min),
                                          self.now,
                                          padding=0)
         self.ui.btnNow.setDisabled(now_in_range)
+        self._update_curves()
 
-        # Update the curves.
+    def _update_curves(self):
+        """Redraws the curves within the current X-axis range."""
+        self._view_changed = False
+        x_min, x_max = self.view_boxes[0].viewRange()[0]
+        max_points = self._get_max_points()
         for ci in self.curve_items:
-            ci.update_curve(x_min, x_max)
+            ci.update_curve(x_min, x_max, max_points)
+
+    def _get_max_points(self):
+        """Number of points to draw a curve with two points per pixel."""
+        return 2 * int(self.view_boxes[0].width())
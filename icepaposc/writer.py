@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+from collections import namedtuple
+from threading import Thread
+import os
+import queue
+import time
+import zipfile
+from .export import write_csv, write_npz
+
+
+class FileWriter(Thread):
+    """
+    Writes collected data to CSV or NPZ files in its own thread.
+
+    The file is kept open while jobs for the same path arrive and is
+    synced to disk after every job. Until it is closed it is named
+    "<path>.part", so a file with the final name is always complete.
+
+    The zip directory of a NPZ file is written when it is closed, and
+    after a job at most every checkpoint seconds. The next job overwrites
+    it, so a NPZ ".part" file left by a crash is only readable if the
+    crash happened after a checkpoint and before the next job. Otherwise
+    its members can be salvaged with recover_npz().
+    """
+
+    # A request to append rows of samples to a file.
+    #   path      - File path. The format is selected by the extension
+    #               (".npz" or CSV otherwise).
+    #   columns   - List of tuples (header, array) with the new samples.
+    #               The arrays must not change after the job is submitted.
+    #   first_row - Number of the first row.
+    #   precision - CSV only. Number of significant digits. None for full
+    #               precision.
+    #   metadata  - NPZ only. Dictionary describing the capture. Stored
+    #               when the file is created.
+    #   compress  - NPZ only. If True, the arrays are compressed.
+    Job = namedtuple('Job', ['path', 'columns', 'first_row', 'precision',
+                             'metadata', 'compress'])
+
+    # Request to close the current file.
+    _CLOSE = object()
+
+    def __init__(self, on_error=None, on_backpressure=None, queue_len=16,
+                 max_size=0, checkpoint=10.):
+        """
+        Initializes an instance of class FileWriter.
+
+        on_error        - Function called with an error message when a job
+                          fails. Called from the writer thread.
+        on_backpressure - Function called with the number of pending jobs
+                          when a job is rejected because the queue is full.
+                          Called from the calling thread.
+        queue_len       - Max number of pending jobs.
+        max_size        - File size [bytes] after which the rows continue
+                          in a new file "<name>_<n>.<ext>". 0 for no
+                          limit.
+        checkpoint      - NPZ only. Min time between writes of the zip
+                          directory of a file not closed yet [seconds].
+                          Writing it re-reads the whole directory. 0 for
+                          after every job.
+        """
+        Thread.__init__(self, name='IcepapOSC writer')
+        self.daemon = True
+        self.on_error = on_error
+        self.on_backpressure = on_backpressure
+        self.max_size = max_size
+        self.checkpoint = checkpoint
+        self.queue = queue.Queue(queue_len)
+        self._path = None
+        self._part = 0
+        self._file = None
+        # NPZ only. Zip archive kept open on the file, and monotonic time
+        # its directory was last written.
+        self._zip = None
+        self._checkpoint_time = 0.
+
+    def submit(self, job, block=False):
+        """
+        Queues a job.
+
+        job   - The FileWriter.Job to execute.
+        block - If True, waits for room in the queue.
+        Return: True if queued. False if the queue is full.
+        """
+        try:
+            self.queue.put(job, block)
+        except queue.Full:
+            if self.on_backpressure:
+                self.on_backpressure(self.queue.qsize())
+            return False
+        return True
+
+    def close_file(self, block=True):
+        """
+        Queues the closing of the current file.
+
+        block - If True, waits for room in the queue. If False and the
+                queue is full, the file is closed later, when a job for
+                another file arrives or the writer stops.
+        Return: True if queued.
+        """
+        try:
+            self.queue.put(self._CLOSE, block)
+        except queue.Full:
+            return False
+        return True
+
+    def pending(self):
+        """
+        Retrieves the number of jobs not completed yet.
+
+        Return: Number of jobs.
+        """
+        return self.queue.unfinished_tasks
+
+    def stop(self):
+        """Completes the pending jobs, closes the file and stops."""
+        if self.is_alive():
+            self.queue.put(None)
+            self.join()
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None or job is self._CLOSE:
+                    self._close()
+                    if job is None:
+                        return
+                else:
+                    self._write(job)
+            finally:
+                self.queue.task_done()
+
+    def _get_file_path(self):
+        if not self._part:
+            return self._path
+        root, ext = os.path.splitext(self._path)
+        return '{}_{}{}'.format(root, self._part, ext)
+
+    def _write(self, job):
+        if job.path != self._path:
+            self._close()
+            self._path = job.path
+            self._part = 0
+        is_npz = job.path.lower().endswith('.npz')
+        header = self._file is None
+        if header:
+            path = self._get_file_path() + '.part'
+            try:
+                self._file = open(path, 'w+b' if is_npz else 'w')
+            except Exception as e:
+                self._report('Failed to open file: {}\n{}'.format(path, e))
+                return
+        try:
+            if is_npz:
+                if self._zip is None:
+                    self._zip = zipfile.ZipFile(self._file, 'w')
+                    self._checkpoint_time = time.monotonic()
+                write_npz(self._zip, job.columns, job.first_row,
+                          job.metadata if header else None, job.compress)
+                now = time.monotonic()
+                if now - self._checkpoint_time >= self.checkpoint:
+                    # Writes the zip directory, and reopens the archive
+                    # to append the next jobs.
+                    self._zip.close()
+                    self._zip = zipfile.ZipFile(self._file, 'a')
+                    self._checkpoint_time = now
+            else:
+                write_csv(self._file, job.columns, job.first_row, header,
+                          job.precision)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception as e:
+            msg = 'Failed to write file: {}\n{}'
+            self._report(msg.format(self._file.name, e))
+            return
+        if self.max_size and self._file.tell() >= self.max_size:
+            self._close()
+            self._part += 1
+
+    def _close(self):
+        if self._file is None:
+            return
+        f = self._file
+        self._file = None
+        try:
+            if self._zip is not None:
+                # Writes the zip directory.
+                self._zip.close()
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+            os.replace(f.name, self._get_file_path())
+        except Exception as e:
+            self._report('Failed to close file: {}\n{}'.format(f.name, e))
+        finally:
+            self._zip = None
+
+    def _report(self, msg):
+        print(msg)
+        if self.on_error:
+            self.on_error(msg)
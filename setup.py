@@ -41,6 +41,7 @@ setup(
     entry_points={
         'console_scripts': [
             'icepaposc = icepaposc.__main__:main',
+            'icepaposc-record = icepaposc.recorder:main',
         ],
     },
     install_requires=[
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+from functools import partial
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from icepaposc.collector import Collector
+from icepaposc.settings import Settings
+from icepaposc.simulator import SimulatedController
+
+
+class TestCollector(unittest.TestCase):
+
+    def setUp(self):
+        # The settings are stored in the home folder.
+        self.home = tempfile.TemporaryDirectory()
+        patcher = mock.patch.dict(os.environ, {'HOME': self.home.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.home.cleanup)
+
+    def test_warm_up_does_not_delay_the_acquisition(self):
+        settings = Settings()
+        settings.sample_rate = 20
+        settings.dump_rate = 1
+        # Every configuration query takes longer than the read timeout.
+        backend = partial(SimulatedController, num_axes=4,
+                          cfg_latency=2 * settings.read_timeout / 1000.)
+        samples = []
+        collector = Collector('simulator', 5000, 3, settings,
+                              lambda sid, values: samples.extend(values),
+                              event_loop=False, backend=backend)
+        self.addCleanup(collector.close)
+        for addr in collector.get_available_drivers():
+            collector.start(collector.subscribe(addr, 'PosAxis'))
+        done = threading.Event()
+        collector.warm_up_driver_cfgs(done.set)
+        while not done.wait(0.05):
+            collector.poll()
+        time.sleep(0.1)
+        collector.poll()
+        self.assertEqual(sorted(collector.driver_cfgs),
+                         collector.get_available_drivers())
+        self.assertTrue(samples)
+        self.assertFalse([v for _, v in samples if v != v])
+        self.assertFalse(collector.driver_systems)
+        self.assertFalse([addr for addr, health
+                          in collector.reader.health.items()
+                          if health.isolated])
+
+
+if __name__ == '__main__':
+    unittest.main()
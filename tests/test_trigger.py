@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+import unittest
+from icepaposc.channel import Channel
+from icepaposc.trigger import Trigger, TriggerEngine
+
+
+class TestTriggerEngine(unittest.TestCase):
+
+    def test_capture_covers_all_signals(self):
+        # Signals subscribed at different ticks have their dumps at
+        # different ticks, and every dump is fed signal by signal (as in
+        # Collector._dispatch()).
+        dump_rate = 5
+        period = 1.
+        channels = {1: Channel(1, 'PosAxis'),
+                    2: Channel(1, 'StatMoving'),
+                    3: Channel(2, 'PosAxis')}
+        offsets = {1: 0, 2: 2, 3: 4}
+        captures = []
+        trigger = Trigger(1, 'StatMoving', 'rising', 0.5)
+        engine = TriggerEngine([trigger], 10., 20., captures.append)
+        pending = {sid: [] for sid in channels}
+        for tick in range(200):
+            t = tick * period
+            for sid, channel in channels.items():
+                value = 1. if sid == 2 and tick >= 50 else 0.
+                pending[sid].append((t, value))
+                if (tick + offsets[sid]) % dump_rate:
+                    continue
+                for tv in pending[sid]:
+                    engine.feed(sid, channel, *tv)
+                pending[sid] = []
+        self.assertEqual(len(captures), 1)
+        capture = captures[0]
+        self.assertEqual(len(capture.tracks), len(channels))
+        for track in capture.tracks:
+            self.assertAlmostEqual(track.array_time[0], capture.start)
+            self.assertAlmostEqual(track.array_time[-1], capture.end)
+            self.assertEqual(len(track.array_time), 31)
+
+
+if __name__ == '__main__':
+    unittest.main()
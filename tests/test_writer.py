@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# This file is part of IcepapOCS link:
+#        https://github.com/ALBA-Synchrotron/IcepapOCS
+#
+# Copyright 2017:
+#       MAX IV Laboratory, Lund, Sweden
+#       CELLS / ALBA Synchrotron, Bellaterra, Spain
+#
+# Distributed under the terms of the GNU General Public License,
+# either version 3 of the License, or (at your option) any later version.
+# See LICENSE.txt for more info.
+#
+# You should have received a copy of the GNU General Public License
+# along with IcepapOCS. If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import zipfile
+import numpy as np
+from icepaposc.export import read_npz, recover_npz
+from icepaposc.writer import FileWriter
+
+
+class TestFileWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def _write(self, checkpoint, compress, num_jobs):
+        """
+        Writes jobs of 10 rows, without closing the file.
+
+        Return: The FileWriter, still running.
+        """
+        self.path = os.path.join(self.folder, 'capture{}.npz'.format(
+            int(compress)))
+        writer = FileWriter(checkpoint=checkpoint)
+        writer.start()
+        for job in range(num_jobs):
+            rows = np.arange(job * 10, job * 10 + 10, dtype=float)
+            columns = [('time-1-PosAxis', rows), ('val-1-PosAxis', -rows)]
+            writer.submit(FileWriter.Job(self.path, columns, job * 10, None,
+                                         {'host': 'test'}, compress),
+                          block=True)
+        while writer.pending():
+            time.sleep(0.01)
+        return writer
+
+    def _crash_copy(self, truncate=0):
+        """
+        Copies the ".part" file as a crash would leave it.
+
+        truncate - Number of bytes not written at the end.
+        Return: Path of the copy.
+        """
+        with open(self.path + '.part', 'rb') as f:
+            data = f.read()
+        path = os.path.join(self.folder, 'crash.npz.part')
+        with open(path, 'wb') as f:
+            f.write(data[:len(data) - truncate])
+        return path
+
+    def test_part_readable_after_checkpoint(self):
+        for compress in [False, True]:
+            with self.subTest(compress=compress):
+                writer = self._write(0., compress, 3)
+                path = self._crash_copy()
+                writer.stop()
+                metadata, columns = read_npz(path)
+                self.assertEqual(metadata, {'host': 'test'})
+                np.testing.assert_array_equal(columns['time-1-PosAxis'],
+                                              np.arange(30.))
+
+    def test_recover_part_after_crash(self):
+        for compress in [False, True]:
+            with self.subTest(compress=compress):
+                writer = self._write(3600., compress, 3)
+                # Crash while writing the last member.
+                path = self._crash_copy(truncate=20)
+                writer.stop()
+                with self.assertRaises(zipfile.BadZipFile):
+                    read_npz(path)
+                recovered_path = os.path.join(self.folder, 'recovered.npz')
+                self.assertEqual(recover_npz(path, recovered_path), 6)
+                metadata, columns = read_npz(recovered_path)
+                self.assertEqual(metadata, {'host': 'test'})
+                np.testing.assert_array_equal(columns['time-1-PosAxis'],
+                                              np.arange(30.))
+                np.testing.assert_array_equal(columns['val-1-PosAxis'],
+                                              -np.arange(20.))
+
+
+if __name__ == '__main__':
+    unittest.main()